@@ -1,16 +1,26 @@
 # ReadIdeas.py
 
 import argparse
-import io
 import os
 import sys
-from typing import Any
-
-from Simple_Clausewitz import SimpleCWLexer, SimpleCWParser
-from hw_utils import make_markdown_table
-
-LEXER = SimpleCWLexer()
-PARSER = SimpleCWParser()
+from functools import partial
+from typing import Any, Iterator
+
+from Simple_Clausewitz import (
+    ParseError,
+    QueryIndex,
+    lazy_file,
+    map_files,
+    parse_files,
+    query,
+)
+from hw_utils import (
+    ModFS,
+    ParseCache,
+    metrics,
+    write_html_table,
+    write_markdown_table,
+)
 
 
 def is_group_idea(idea_group: tuple[str, list[Any]]) -> str | None:
@@ -25,77 +35,290 @@ def is_group_idea(idea_group: tuple[str, list[Any]]) -> str | None:
         its name, otherwise return none
     """
     # First element is the name, the second is a list
-    elements = idea_group[1]
+    elements = QueryIndex(idea_group[1])
 
-    for elem in elements:
-        # Check if we have a (Category, {ADM,DIL,MIL}) tuple.
-        if elem[0] == "category":
-            if elem[1] == "ADM" or "DIP" or "MIL":
-                return idea_group[0]
+    # Check if we have a (Category, {ADM,DIL,MIL}) tuple.
+    for category in elements.get_all("category"):
+        if category == "ADM" or "DIP" or "MIL":
+            return idea_group[0]
 
     return None
 
 
-def read_all_files_in_dir(dir: str) -> str:
-    """Read all Files in a directory and return as a string
+def report_errors(errors: list[ParseError]):
+    """Print the errors that were recovered from, one per line
+
+    Args:
+        errors (list[ParseError]): the errors, with their file and line
+    """
+    for e in errors:
+        metrics.count("parse_errors")
+        print(
+            "%s:%s: %s" % (os.path.basename(e.file or "-"), e.lineno or "?", e),
+            file=sys.stderr,
+        )
+
+
+def parse_all_files_in_dir(
+    dir: str,
+    cache: ParseCache | None = None,
+    workers: int = 1,
+    fs: ModFS | None = None,
+    recover: bool = False,
+) -> list[Any]:
+    """Parse all Files in a directory and return their entries, files
+    that fail to parse are reported and skipped
+
+    Args:
+        dir (str): path, relative to the roots of fs, to the directory
+        cache (ParseCache | None, optional): cache of parsed files. Defaults to None.
+        workers (int, optional): how many files to parse at the same time. Defaults to 1.
+        fs (ModFS | None, optional): roots to find the files in, overriding each other. Defaults to the current directory.
+        recover (bool, optional): report the errors in the files and keep the entries they are not in, instead of skipping the files. Defaults to False.
+
+    Returns:
+        list[Any]: the entries of all the files in dir, one after the other
+    """
+    if fs is None:
+        fs = ModFS(["."])
+    paths = fs.files(dir)
+
+    result: list[Any] = []
+    # Compact trees, there can be a lot of ideas and they are all kept
+    for path, entries, e in parse_files(
+        paths, workers, cache, compact=True, recover=recover
+    ):
+        metrics.count("files")
+        if e is not None:
+            metrics.count("failures")
+            print(
+                "%s: failed to parse: %s" % (os.path.basename(path), e), file=sys.stderr
+            )
+            continue
+        if recover:
+            entries, errors = entries
+            report_errors(errors)
+        result.extend(entries)
+
+    return result
+
+
+def policy_requirements(tree: Any) -> list[tuple[str, str]]:
+    """Find which ideas each policy requires
 
     Args:
-        dir (str): path, relative or absolute, to the directory
+        tree (Any): the parsed policies file, or its LazyCWFile
 
     Returns:
-        str: all the files in dir, concatenated with a newline of separation
+        list[tuple[str, str]]: (policy, idea) tuples for every has_idea_group
+        found in the potential = { } of a policy, in order
     """
-    wfd = io.StringIO()
-    for file in os.listdir(dir):
-        with open(f"{dir}/{file}", "r") as fd:
-            wfd.write(fd.read())
-            wfd.write("\n")
+    return [
+        (keys[0], idea)
+        for keys, idea in query(tree, "*/potential[0]/has_idea_group", with_keys=True)
+    ]
+
 
-    return wfd.getvalue()
+def read_policies(path: str, cache: ParseCache | None = None) -> list[tuple[str, str]]:
+    """Read which ideas each policy in a file requires
 
+    Args:
+        path (str): path to the policies file
+        cache (ParseCache | None, optional): cache of parsed files. Defaults to None.
 
-def generate_policy_list(dir) -> dict[str, list[str]]:
+    Returns:
+        list[tuple[str, str]]: (policy, idea) tuples for every has_idea_group
+        found in the potential = { } of a policy, in order
+    """
+    # Only the potential = { } of each policy is parsed, and only the
+    # first one is checked
+    with lazy_file(path, cache) as result:
+        return policy_requirements(result)
+
+
+def generate_policy_list(
+    dir,
+    cache: ParseCache | None = None,
+    workers: int = 1,
+    fs: ModFS | None = None,
+    recover: bool = False,
+) -> dict[str, list[str]]:
     """Generates a dictionary of defined policies returning a dictionary
     with all policies and what ideas one must have. Assumes ideas found
     via potential = { has_idea_group = <idea> } are the only requirements
 
     Args:
         dir (_type_): path to the mod directory
+        cache (ParseCache | None, optional): cache of parsed files. Defaults to None.
+        workers (int, optional): how many files to parse at the same time. Defaults to 1.
+        fs (ModFS | None, optional): roots to find the files in, instead of dir. Defaults to None.
+        recover (bool, optional): report the errors in the files and keep the policies they are not in, instead of skipping the files. Defaults to False.
 
     Returns:
         dict[str, list[str]]: Dictionary with the keys named after
         policies, the value of a key is a list of ideas that are required
     """
-    stream = read_all_files_in_dir(f"{dir}/common/policies")
-    result = PARSER.parse(LEXER.tokenize(stream))
-
     # Map the policies into a Dictionary with list, and have
     # the ideas we are testing for intersection.
     Policies: dict[str, list[str]] = dict()
 
-    for policy in result:
-        # policy_name
-        policy_name = policy[0]
+    if fs is None:
+        fs = ModFS([dir])
+    paths = fs.files("common/policies")
+    if recover:
+        # The whole files are parsed, the lazy index can't skip errors
+        results = parse_files(paths, workers, cache, recover=True)
+    else:
+        results = map_files(partial(read_policies, cache=cache), paths, workers)
+    for path, requirements, e in results:
+        metrics.count("files")
+        if e is not None:
+            metrics.count("failures")
+            print(
+                "%s: failed to parse: %s" % (os.path.basename(path), e), file=sys.stderr
+            )
+            continue
+        if recover:
+            tree, errors = requirements
+            report_errors(errors)
+            requirements = policy_requirements(tree)
+
+        for policy_name, idea in requirements:
+            # If the key does not exist, create it
+            if policy_name not in Policies:
+                Policies[policy_name] = list()
+
+            # Then append to it
+            Policies[policy_name].append(idea)
 
-        # The second element (index 1) of the tuplet is a list
-        # of everything inside it, check it for potential
-        for element in policy[1]:
-            if element[0] != "potential":
-                continue
+    return Policies
 
-            for elem in element[1]:
-                if elem[0] == "has_idea_group":
-                    # If the key does not exist, create it
-                    if policy_name not in Policies:
-                        Policies[policy_name] = list()
 
-                    # Then append to it
-                    Policies[policy_name].append(elem[1])
+def index_policy_pairs(
+    policies: dict[str, list[str]]
+) -> dict[frozenset[str], list[str]]:
+    """Index the policies by the pairs of ideas they require, so the
+    policies of a pair are found without going over all of them
 
-            # Check only the first time
-            break
+    Args:
+        policies (dict[str, list[str]]): the policies and their ideas, from generate_policy_list
 
-    return Policies
+    Returns:
+        dict[frozenset[str], list[str]]: the policies that require both
+        ideas of every unordered pair, in the order of policies, a single
+        idea is also a pair with itself
+    """
+    pairs: dict[frozenset[str], list[str]] = dict()
+    for key, values in policies.items():
+        ideas = list(dict.fromkeys(values))
+        for i, idea in enumerate(ideas):
+            for other in ideas[i:]:
+                pairs.setdefault(frozenset((idea, other)), []).append(key)
+
+    return pairs
+
+
+def matrix_table(
+    ideas: list[str], pairs: dict[frozenset[str], list[str]]
+) -> Iterator[list[str]]:
+    """Build the matrix of which policies every pair of ideas has
+
+    Args:
+        ideas (list[str]): the group ideas
+        pairs (dict[frozenset[str], list[str]]): the policies of each pair, from index_policy_pairs
+
+    Yields:
+        Iterator[list[str]]: the rows of the markdown table, the first one
+        being the ideas
+    """
+    # Create a matrix that will be converted into a markdown table
+    # format:
+    # [[- 1 2 3 4 5]
+    #  [1 - b c d e]
+    #  [2 a - c d e]
+    #  [3 a b - d e]
+    #  [4 a b c - e]
+    #  [5 a b c d -]]
+    yield ["", *ideas]
+
+    for index, idea in enumerate(ideas):
+        table_row: list[str] = [idea]
+        for i, other in enumerate(ideas):
+            if i == index:
+                table_row.append(" - ")
+            elif (
+                # Ante-Bellum specific as the Global Domination ideas
+                # has no policies as intended
+                other == "globaldomination_ideas"
+                or idea == "globaldomination_ideas"
+            ):
+                table_row.append("No Policies by Design")
+            else:
+                # Map the policies found to the table
+                found = pairs.get(frozenset((idea, other)))
+                if found:
+                    table_row.extend(found)
+                else:
+                    # If we can't find a policy
+                    table_row.append("missing")
+
+        yield table_row
+
+
+def sparse_table(
+    ideas: list[str], pairs: dict[frozenset[str], list[str]]
+) -> Iterator[list[str]]:
+    """Build the list of the pairs of ideas that have policies, which
+    stays small on mods with a lot of ideas
+
+    Args:
+        ideas (list[str]): the group ideas
+        pairs (dict[frozenset[str], list[str]]): the policies of each pair, from index_policy_pairs
+
+    Yields:
+        Iterator[list[str]]: the rows of the markdown table, the first one
+        being the header, then one per policy of every pair, in the order
+        of the ideas
+    """
+    yield ["Idea", "Idea", "Policy"]
+
+    for index, idea in enumerate(ideas):
+        for other in ideas[index + 1 :]:
+            for policy in pairs.get(frozenset((idea, other)), ()):
+                yield [idea, other, policy]
+
+
+def table_cells(ideas: list[str], pairs: dict[frozenset[str], list[str]]) -> set[str]:
+    """Everything that can be in a cell of the tables, without building them
+
+    Args:
+        ideas (list[str]): the group ideas
+        pairs (dict[frozenset[str], list[str]]): the policies of each pair, from index_policy_pairs
+
+    Returns:
+        set[str]: the ideas, the policies and the fixed cells
+    """
+    cells = {"", " - ", "missing", "No Policies by Design", "Idea", "Policy"}
+    cells.update(ideas)
+    for policies in pairs.values():
+        cells.update(policies)
+
+    return cells
+
+
+def localise_rows(rows: Iterator[list[str]], localisation: Any) -> Iterator[list[str]]:
+    """Replace the cells of the rows that have localisation
+
+    Args:
+        rows (Iterator[list[str]]): rows from matrix_table or sparse_table
+        localisation (Any): LocalisationResolver to get the names from
+
+    Yields:
+        Iterator[list[str]]: the rows with the localised cells
+    """
+    for row in rows:
+        metrics.count("localisation_lookups", len(row))
+        yield [localisation.get(y, y) for y in row]
 
 
 def parse_args(args=None):
@@ -126,7 +349,20 @@ def parse_args(args=None):
         "--out",
         type=argparse.FileType("w"),
         default=sys.stdout,
-        help="Where to output the markdown table",
+        help="Where to output the table",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=["markdown", "html"],
+        default="markdown",
+        help="write a Markdown table, or a styled HTML page with the table",
+    )
+    parser.add_argument(
+        "--highlight-first-row",
+        default=False,
+        action="store_true",
+        help="Highlight the first row on the left, for --format=html",
     )
     parser.add_argument(
         "--lang",
@@ -135,11 +371,39 @@ def parse_args(args=None):
         default=None,
         help="language for the localisation",
     )
+    parser.add_argument(
+        "-c",
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="keep parsed files in this directory and reuse them while they don't change",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="how many files to parse at the same time",
+    )
+    parser.add_argument(
+        "-s",
+        "--sparse",
+        default=False,
+        action="store_true",
+        help="list the pairs of ideas that have policies instead of the whole matrix",
+    )
+    parser.add_argument(
+        "-r",
+        "--recover",
+        default=False,
+        action="store_true",
+        help="report the errors in files and keep going from the next entry, instead of skipping the files",
+    )
+    metrics.add_arguments(parser)
     return parser.parse_args(args)
 
 
-def main(args=None) -> int:
-    args = parse_args(args)
+def run(args: argparse.Namespace) -> int:
     moddir = args.moddir
 
     if args.localise is False:
@@ -150,6 +414,11 @@ def main(args=None) -> int:
         else:
             args.lang = "english"
 
+    # Open the cache before changing directories, it can be a relative path
+    cache = None
+    if args.cache_dir is not None:
+        cache = ParseCache(args.cache_dir)
+
     # Switch to the path given to us
     try:
         os.chdir(moddir)
@@ -166,9 +435,19 @@ def main(args=None) -> int:
         print("%s: %s" % (moddir, e), file=sys.stderr)
         return 1
 
-    # Copy all files from the ideas folder
-    stream = read_all_files_in_dir("common/ideas")
-    result = PARSER.parse(LEXER.tokenize(stream))
+    # Every folder of the mod is only listed once
+    fs = ModFS([os.getcwd()], None if cache is None else cache.directory)
+
+    # Parse all files from the ideas folder
+    try:
+        with metrics.phase("ideas"):
+            result = parse_all_files_in_dir(
+                "common/ideas", cache, args.jobs, fs, args.recover
+            )
+    except FileNotFoundError as e:
+        # Most likely not a mod, an empty table would look like one
+        print(e, file=sys.stderr)
+        return 1
 
     # The result is a List of all tuples, let's parse it.
     Group_Ideas: list[str] = [
@@ -179,79 +458,80 @@ def main(args=None) -> int:
         if ret is not None:
             Group_Ideas.append(ret)
 
-    # Get number of ideas, reduce the length by one as the first
-    # row is a '-'
-    num_of_ideas = len(Group_Ideas) - 1
-
-    # Create a matrix that will be converted into a markdown table
-    # format:
-    # [[- 1 2 3 4 5]
-    #  [1 - b c d e]
-    #  [2 a - c d e]
-    #  [3 a b - d e]
-    #  [4 a b c - e]
-    #  [5 a b c d -]]
-    Idea_Table: list[list] = [[]]
-
-    # Re-use the extracted group ideas from the first row
-    Idea_Table[0] = Group_Ideas
-
-    # Get all the policies
-    policies = generate_policy_list(moddir)
-
-    # Skip the first element as it is a '-' and we only
-    # want it for the top-most left field
-    for index, idea in enumerate(Group_Ideas[1:]):
-        table_row: list[str] = [idea]
-        i = 0
-        while i < num_of_ideas:
-            if i == index:
-                table_row.append(" - ")
-            elif (
-                # Ante-Bellum specific as the Global Domination ideas
-                # has no policies as intended
-                Group_Ideas[i + 1] == "globaldomination_ideas"
-                or idea == "globaldomination_ideas"
-            ):
-                table_row.append("No Policies by Design")
-            else:
-                has_found_policy = False
-                # Check if we can find a policy, and map it to the table
-                for key, values in policies.items():
-                    # Add 1 as we index over 0 and we need to catch up
-                    if idea in values and Group_Ideas[i + 1] in values:
-                        has_found_policy = True
-                        table_row.append(key)
-
-                # If we can't find a policy
-                if not has_found_policy:
-                    table_row.append("missing")
-
-            i += 1
+    # Get all the policies, indexed by the pairs of ideas they need
+    try:
+        with metrics.phase("policies"):
+            pairs = index_policy_pairs(
+                generate_policy_list(moddir, cache, args.jobs, fs, args.recover)
+            )
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        return 1
 
-        Idea_Table.append(table_row)
+    # The rows are only built as they are written
+    if args.sparse:
+        Idea_Table = sparse_table(Group_Ideas[1:], pairs)
+    else:
+        Idea_Table = matrix_table(Group_Ideas[1:], pairs)
 
     # Localise
     if args.localise:
         # Helper function to generate dictionary mapping keys
         # to values and versions
-        from Paradox_Localisation import generate_localisation
+        from Paradox_Localisation import (
+            LocalisationResolver,
+            LocalisationStore,
+            generate_localisation,
+        )
 
         search_dirs: list[str] = [moddir]
         if args.base is not None:
             search_dirs.extend(args.base)
-        localisation = generate_localisation(search_dirs, language=args.lang)
+        try:
+            with metrics.phase("localisation"):
+                if cache is not None:
+                    # Only the files that changed since the last run are read
+                    localisation = LocalisationStore(
+                        search_dirs, args.lang, cache.directory
+                    )
+                else:
+                    # Only the names of what is in the table are needed
+                    localisation = generate_localisation(
+                        search_dirs,
+                        language=args.lang,
+                        workers=args.jobs,
+                        keys=table_cells(Group_Ideas, pairs),
+                        references=True,
+                        fs=fs,
+                    )
+        except FileNotFoundError as e:
+            print(e, file=sys.stderr)
+            return 1
+        # The names with the $KEY$ references in them expanded
+        localisation = LocalisationResolver(localisation)
 
         # Run over all the values of the table and replace them.
-        for idx, x in enumerate(Idea_Table):
-            for idy, y in enumerate(x):
-                if y in localisation:
-                    # The [1:-1] is to remove the double-quotes
-                    Idea_Table[idx][idy] = localisation[y]["value"][1:-1]
-
-    args.out.write(make_markdown_table(Idea_Table))
+        Idea_Table = localise_rows(Idea_Table, localisation)
+
+    if args.format == "html":
+        write_table = partial(
+            write_html_table, highlight_first_row=args.highlight_first_row
+        )
+    else:
+        write_table = write_markdown_table
+
+    # The table is built, and localised, as it is written
+    with metrics.phase("render"):
+        write_table(args.out, next(Idea_Table), Idea_Table)
+    fs.save()
     return 0
 
 
+def main(args=None) -> int:
+    args = parse_args(args)
+    with metrics.instrument("Generate-Policy-Table", args.profile, args.metrics_json):
+        return run(args)
+
+
 if __name__ == "__main__":
     sys.exit(main())
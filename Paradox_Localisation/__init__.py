@@ -2,10 +2,25 @@ from .lexer import LocalisationLexer
 from .parser import LocalisationParser
 
 # Helper functions
-from .utils import generate_localisation
+from .utils import (
+    KeySelector,
+    generate_localisation,
+    generate_localisations,
+    localisation_coverage,
+    read_localisation_file,
+)
+from .store import LocalisationStore
+from .resolve import LocalisationResolver, ReferenceCycleError
 
 __all__ = (
     "LocalisationLexer",
     "LocalisationParser",
     "generate_localisation",
+    "generate_localisations",
+    "localisation_coverage",
+    "read_localisation_file",
+    "KeySelector",
+    "LocalisationStore",
+    "LocalisationResolver",
+    "ReferenceCycleError",
 )
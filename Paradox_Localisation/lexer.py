@@ -1,3 +1,5 @@
+import sys
+
 from sly import Lexer
 
 
@@ -35,5 +37,5 @@ class LocalisationLexer(Lexer):
     ignore_comment = r"\#.*"
 
     def error(self, t):
-        print("Line %d: Bad character %r" % (self.lineno, t.value[0]))
+        print("Line %d: Bad character %r" % (self.lineno, t.value[0]), file=sys.stderr)
         self.index += 1
@@ -0,0 +1,162 @@
+import sys
+from typing import Any, Iterable, Mapping
+
+from Paradox_Localisation.utils import _REFERENCE_RE, _unquote
+
+
+class ReferenceCycleError(Exception):
+    def __init__(self, keys: list[str]):
+        super().__init__("Reference cycle: %s" % " -> ".join(keys))
+        # The keys of the cycle, the first one is also the last one
+        self.keys = keys
+
+
+class LocalisationResolver:
+    """Text of localisation keys with the $KEY$ references in them expanded.
+
+    It works over the dictionary from generate_localisation or over a
+    LocalisationStore. The double-quotes of a value are stripped the first
+    time the key is looked up, and every key is only expanded once, so the
+    fragments many values share don't get expanded again and resolving all
+    the keys takes as long as going over every value once.
+
+    References to keys that are not in the localisation, like $COUNTRY$,
+    are left as they are. A reference can have a format after a '|', like
+    $KEY|Y$, the format is dropped along with the reference. Looking up a
+    key that ends up referencing itself, which the game puts up with,
+    gives its value without expanding it and warns on stderr, only
+    resolve() raises for it.
+    """
+
+    def __init__(self, localisation: Mapping[str, dict[str, Any]] | Any):
+        """Resolve the keys of a localisation
+
+        Args:
+            localisation (Mapping[str, dict[str, Any]] | Any): the dictionary from generate_localisation or a LocalisationStore
+        """
+        self.localisation = localisation
+        # Values without their double-quotes, None for missing keys
+        self._texts: dict[str, str | None] = dict()
+        # Values with their references expanded
+        self._resolved: dict[str, str] = dict()
+        # Keys in a reference cycle that were already warned about
+        self._cycles: set[str] = set()
+
+    def text(self, key: str) -> str | None:
+        """Value of a key without its double-quotes, references are not expanded
+
+        Args:
+            key (str): the localisation key
+
+        Returns:
+            str | None: the value, or None if the key is not in the localisation
+        """
+        if key not in self._texts:
+            entry = self.localisation.get(key)
+            self._texts[key] = None if entry is None else _unquote(entry["value"])
+        return self._texts[key]
+
+    def _references(self, key: str) -> list[str]:
+        # Referenced keys that still have to be expanded
+        return [
+            m.group("key")
+            for m in _REFERENCE_RE.finditer(self._texts[key] or "")
+            if m.group("key") not in self._resolved
+            and self.text(m.group("key")) is not None
+        ]
+
+    def _expand(self, key: str) -> str:
+        def replace(m) -> str:
+            return self._resolved.get(m.group("key"), m.group(0))
+
+        return _REFERENCE_RE.sub(replace, self._texts[key] or "")
+
+    def resolve(self, key: str) -> str:
+        """Value of a key with all its references expanded, and the ones of
+        the keys they reference in turn
+
+        Args:
+            key (str): the localisation key
+
+        Raises:
+            KeyError: if the key is not in the localisation
+            ReferenceCycleError: if the key ends up referencing itself
+
+        Returns:
+            str: the expanded value, without double-quotes
+        """
+        if key in self._resolved:
+            return self._resolved[key]
+        if self.text(key) is None:
+            raise KeyError(key)
+
+        # Keys being expanded, each waiting on the ones it references,
+        # with an explicit stack so long chains don't hit the recursion
+        # limit
+        stack = [(key, iter(self._references(key)))]
+        expanding = {key}
+        while stack:
+            current, references = stack[-1]
+            for reference in references:
+                if reference in self._resolved:
+                    continue
+                if reference in expanding:
+                    keys = [k for k, _ in stack]
+                    raise ReferenceCycleError(
+                        keys[keys.index(reference) :] + [reference]
+                    )
+                stack.append((reference, iter(self._references(reference))))
+                expanding.add(reference)
+                break
+            else:
+                self._resolved[current] = self._expand(current)
+                expanding.discard(current)
+                stack.pop()
+
+        return self._resolved[key]
+
+    def resolve_all(self, keys: Iterable[str] | None = None) -> dict[str, str]:
+        """Expand many keys, skipping the ones that are not in the localisation
+
+        Args:
+            keys (Iterable[str] | None, optional): the keys to expand, they must be given for a LocalisationStore. Defaults to all the keys of the dictionary.
+
+        Raises:
+            ReferenceCycleError: if one of the keys ends up referencing itself
+
+        Returns:
+            dict[str, str]: the expanded value of every key
+        """
+        if keys is None:
+            keys = self.localisation.keys()
+
+        return {key: self.resolve(key) for key in keys if self.text(key) is not None}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Expanded value of a key
+
+        Args:
+            key (str): the localisation key
+            default (Any, optional): what to return if the key is not in the localisation. Defaults to None.
+
+        Returns:
+            Any: the expanded value, without double-quotes, or default, or
+            the value as it is if the key ends up referencing itself
+        """
+        if self.text(key) is None:
+            return default
+        try:
+            return self.resolve(key)
+        except ReferenceCycleError as e:
+            if key not in self._cycles:
+                self._cycles.add(key)
+                print("%s: %s, left unexpanded" % (key, e), file=sys.stderr)
+            return self.text(key)
+
+    def __getitem__(self, key: str) -> str:
+        if self.text(key) is None:
+            raise KeyError(key)
+        return self.get(key)
+
+    def __contains__(self, key: Any) -> bool:
+        return isinstance(key, str) and self.text(key) is not None
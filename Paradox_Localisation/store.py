@@ -0,0 +1,222 @@
+import hashlib
+import os
+import sqlite3
+from typing import Any, Iterator
+
+from Paradox_Localisation.utils import localisation_files, read_localisation_file
+
+# Bump whenever the tables or what is stored in them change, stores
+# with another version are built again from scratch
+STORE_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    rank INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL
+);
+CREATE TABLE entries (
+    file INTEGER NOT NULL REFERENCES files(id),
+    position INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE INDEX entries_key ON entries(key);
+CREATE INDEX entries_file ON entries(file);
+"""
+
+# Every key can be in more than one file, the one that counts is the
+# first one in the first file, like in generate_localisation
+_GET = """
+SELECT value, version FROM entries JOIN files ON entries.file = files.id
+WHERE key = ? ORDER BY rank, position LIMIT 1
+"""
+
+_PREFIX = """
+SELECT key, value, version FROM (
+    SELECT key, value, version, ROW_NUMBER() OVER (
+        PARTITION BY key ORDER BY rank, position
+    ) AS n
+    FROM entries JOIN files ON entries.file = files.id
+    WHERE key >= ? AND key < ?
+) WHERE n = 1 ORDER BY key
+"""
+
+
+class LocalisationStore:
+    """Localisation of a list of directories compiled into a SQLite file.
+
+    It holds the same keys, values and versions generate_localisation
+    would return for the same directories and language, but looks them up
+    in the file instead of loading them all in memory. Opening it only
+    reads again the files that changed size or mtime, or that were added,
+    since the last time.
+
+    It can be used in place of the dictionary from generate_localisation
+    for looking up keys, store[key]["value"], key in store and get().
+    """
+
+    def __init__(
+        self,
+        dirs: list[str],
+        language: str = "english",
+        directory: str | None = None,
+    ):
+        """Open, building or updating it if needed, the store of a list of
+        directories
+
+        Args:
+            dirs (list[str]): list of paths to directories to load all the localisation files from.
+            language (str, optional): which language do we get our localisation for. Defaults to "english".
+            directory (str | None, optional): where to keep the store. Defaults to default_cache_dir() of hw_utils.
+        """
+        if directory is None:
+            from hw_utils.cache import default_cache_dir
+
+            directory = default_cache_dir()
+        os.makedirs(directory, exist_ok=True)
+
+        self.dirs = [os.path.abspath(dir) for dir in dirs]
+        self.language = language
+
+        # One store per list of directories and language
+        name = hashlib.sha1("\0".join([str(language), *self.dirs]).encode()).hexdigest()
+        self.path = os.path.join(directory, "localisation-%s.sqlite3" % name)
+
+        self._db = sqlite3.connect(self.path)
+        # It can always be built again from the files, so it is fine to
+        # not wait for every write to hit the disk
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != STORE_VERSION:
+            with self._db:
+                self._db.execute("DROP TABLE IF EXISTS entries")
+                self._db.execute("DROP TABLE IF EXISTS files")
+                self._db.executescript(_SCHEMA)
+                self._db.execute("PRAGMA user_version = %d" % STORE_VERSION)
+
+        self.update()
+
+    def update(self) -> int:
+        """Read again the files that changed, were added or are no longer
+        used since the store was last updated
+
+        Returns:
+            int: how many files were read
+        """
+        paths = [
+            os.path.abspath(path)
+            for path in localisation_files(self.dirs, self.language)
+        ]
+
+        read = 0
+        with self._db:
+            # Other processes can't update it at the same time
+            self._db.execute("BEGIN IMMEDIATE")
+            stored: dict[str, tuple[int, int, int]] = {
+                path: (id, size, mtime)
+                for id, path, size, mtime in self._db.execute(
+                    "SELECT id, path, size, mtime FROM files"
+                )
+            }
+
+            # Files that are gone, or shadowed by a file that was added
+            for path in stored.keys() - set(paths):
+                self._remove(stored[path][0])
+
+            for rank, path in enumerate(paths):
+                st = os.stat(path)
+                if path in stored:
+                    id, size, mtime = stored[path]
+                    if size == st.st_size and mtime == st.st_mtime_ns:
+                        # Only where it goes in the order can change
+                        self._db.execute(
+                            "UPDATE files SET rank = ? WHERE id = ?", (rank, id)
+                        )
+                        continue
+                    self._remove(id)
+
+                cursor = self._db.execute(
+                    "INSERT INTO files (path, rank, size, mtime) VALUES (?, ?, ?, ?)",
+                    (path, rank, st.st_size, st.st_mtime_ns),
+                )
+                self._db.executemany(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (cursor.lastrowid, position, key, value, version)
+                        for position, (key, value, version) in enumerate(
+                            read_localisation_file(path)
+                        )
+                    ),
+                )
+                read += 1
+
+        return read
+
+    def _remove(self, id: int):
+        self._db.execute("DELETE FROM entries WHERE file = ?", (id,))
+        self._db.execute("DELETE FROM files WHERE id = ?", (id,))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Look up a key
+
+        Args:
+            key (str): the localisation key
+            default (Any, optional): what to return if the key is not in any file. Defaults to None.
+
+        Returns:
+            Any: a dictionary with the value and version of the key, like
+            generate_localisation has them, or default
+        """
+        row = self._db.execute(_GET, (key,)).fetchone()
+        if row is None:
+            return default
+        return {"value": row[0], "version": row[1]}
+
+    def prefix(self, prefix: str) -> Iterator[tuple[str, dict[str, Any]]]:
+        """Look up all the keys that start with a prefix
+
+        Args:
+            prefix (str): start of the keys, like "ars_"
+
+        Yields:
+            Iterator[tuple[str, dict[str, Any]]]: (key, dictionary with the
+            value and version) tuples, sorted by key
+        """
+        # Every key that starts with prefix sorts before prefix followed
+        # by the highest character there is
+        end = prefix + chr(0x10FFFF)
+        for key, value, version in self._db.execute(_PREFIX, (prefix, end)):
+            yield key, {"value": value, "version": version}
+
+    def close(self):
+        """Close the store"""
+        self._db.close()
+
+    def __getitem__(self, key: str) -> dict[str, Any]:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: Any) -> bool:
+        if not isinstance(key, str):
+            return False
+        return (
+            self._db.execute(
+                "SELECT 1 FROM entries WHERE key = ? LIMIT 1", (key,)
+            ).fetchone()
+            is not None
+        )
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(DISTINCT key) FROM entries").fetchone()[0]
+
+    def __enter__(self) -> "LocalisationStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,63 +1,361 @@
-from typing import Any
-from Paradox_Localisation.lexer import LocalisationLexer
-from Paradox_Localisation.parser import LocalisationParser
+import io
+import re
+from functools import partial
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Callable, Collection, Iterable, Iterator
+
+from Simple_Clausewitz.files import iter_files
+
+if TYPE_CHECKING:
+    from hw_utils.cache import ParseCache
+    from hw_utils.vfs import ModFS
+
+# A key:version "value" line, the same tokens LocalisationLexer has, the
+# version is optional and the value keeps its double-quotes and goes
+# up to the last double-quote in the line
+_ENTRY_RE = re.compile(
+    r'[ \t\ufeff]*(?P<key>[A-Za-z0-9_\-.]+)[ \t]*:[ \t]*(?:(?P<version>[0-9]+)\b)?[ \t]*(?P<value>".*")'
+)
+# Only the key of a line, to skip the ones that are not wanted
+_KEY_RE = re.compile(r"[ \t\ufeff]*([A-Za-z0-9_\-.]+)[ \t]*:")
+# A $KEY$ reference inside a value, with an optional |format
+_REFERENCE_RE = re.compile(r"\$(?P<key>[A-Za-z0-9_\-.]+)(?:\|[^$\n]*)?\$")
+
+
+def _unquote(value: str) -> str:
+    # Values keep their double-quotes, like the Parser gives them
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+class KeySelector:
+    """Which localisation keys to load, picklable so it can be given to
+    the processes reading the files"""
+
+    def __init__(
+        self,
+        keys: Collection[str] | Callable[[str], bool] | None = None,
+        prefixes: Iterable[str] | None = None,
+    ):
+        """Select keys by name, by a function or by how they start, a key
+        is selected if any of them selects it
+
+        Args:
+            keys (Collection[str] | Callable[[str], bool] | None, optional): the keys, or a function telling if a key is wanted. Defaults to None.
+            prefixes (Iterable[str] | None, optional): starts of the keys. Defaults to None.
+        """
+        self.predicate = keys if callable(keys) else None
+        self.keys: frozenset[str] = frozenset(() if callable(keys) else keys or ())
+        self.prefixes = tuple(prefixes or ())
+
+    def exact(self) -> bool:
+        """Whether only keys given by name are selected, so we know when
+        all of them were found
+
+        Returns:
+            bool: True if there is no predicate and no prefixes
+        """
+        return self.predicate is None and not self.prefixes
+
+    def __call__(self, key: str) -> bool:
+        if key in self.keys:
+            return True
+        if self.prefixes and key.startswith(self.prefixes):
+            return True
+        return self.predicate is not None and self.predicate(key)
+
+
+def read_localisation_file(
+    path: str, select: Callable[[str], bool] | None = None
+) -> Iterator[tuple[str, str, int]]:
+    """read the entries of a single localisation file one line at a time.
+
+    Args:
+        path (str): path to the localisation file.
+        select (Callable[[str], bool] | None, optional): only read the entries whose key this returns True for, like a KeySelector. Defaults to None.
+
+    Yields:
+        Iterator[tuple[str, str, int]]: (key, value, version) tuples in the order they are in the file, the version is 0 if it has none.
+    """
+    with open(path, "r", encoding="utf-8-sig") as fd:
+        yield from _read_lines(fd, select)
+
+
+def _read_lines(
+    lines: Iterable[str], select: Callable[[str], bool] | None
+) -> Iterator[tuple[str, str, int]]:
+    for line in lines:
+        if select is not None:
+            # Look at the key alone first, most lines are skipped
+            k = _KEY_RE.match(line)
+            if k is None or not select(k.group(1)):
+                continue
+
+        m = _ENTRY_RE.match(line)
+        if m is None:
+            # Comments, blank lines and the l_<language>: header
+            continue
+
+        version = m.group("version")
+        yield m.group("key"), m.group("value"), int(version or 0)
+
+
+def _localisation_files(
+    dirs: list[str], languages: list[str], fs: "ModFS | None" = None
+) -> dict[str, list[str]]:
+    from hw_utils.vfs import ModFS
+
+    # The files of the last directory override the ones with the same
+    # name in the directories before it
+    roots = list(reversed(dirs))
+    fs = ModFS(roots) if fs is None else fs.stack(roots)
+
+    # Every directory is only listed once, whatever the languages
+    return {
+        language: fs.files("localisation", f"l_{language}.yml")
+        for language in languages
+    }
+
+
+def localisation_files(
+    dirs: list[str], language: str = "english", fs: "ModFS | None" = None
+) -> list[str]:
+    """list the localisation files to read from a list of directories, in the order their keys take precedence.
+
+    Args:
+        dirs (list[str]): list of paths to directories where we get load all the localisation files.
+        language (str, optional): which language do we get our localisation for. Defaults to "english".
+        fs (ModFS | None, optional): list the directories through it, to share its listings with other tools. Defaults to None.
+
+    Raises:
+        FileNotFoundError: if none of the directories has a localisation folder
+
+    Returns:
+        list[str]: paths to the files, a file is only taken from the first directory that has a file with its name.
+    """
+    return _localisation_files(dirs, [language], fs)[language]
+
+
+def _load_entries(
+    path: str,
+    cache: "ParseCache | None" = None,
+    select: Callable[[str], bool] | None = None,
+) -> list[tuple[str, str, int]]:
+    if cache is None:
+        return list(read_localisation_file(path, select))
+
+    # All the entries are cached, whatever is selected, read from the
+    # content the cache read so it knows what was parsed
+    entries = cache.load(
+        path,
+        "localisation-entries",
+        lambda data: list(
+            _read_lines(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig"), None)
+        ),
+    )
+    if select is None:
+        return entries
+    return [entry for entry in entries if select(entry[0])]
+
+
+def _read_pool(
+    paths: list[str],
+    cache: "ParseCache | None",
+    workers: int,
+    select: KeySelector | None,
+) -> Iterator[list[tuple[str, str, int]]]:
+    # Only a few files are read ahead of the merge, so once it found
+    # every key the ones after them are not read
+    load = partial(_load_entries, cache=cache, select=select)
+    for _, entries, e in iter_files(load, paths, workers):
+        if e is not None:
+            raise e
+        yield entries
+
+
+def _read_files(
+    paths: list[str],
+    cache: "ParseCache | None",
+    workers: int,
+    select: KeySelector | None,
+) -> Iterable[Iterable[tuple[str, str, int]]]:
+    # The entries of every file, in the order of the paths
+    if workers > 1:
+        # Read in a pool, but merged in the order of the paths so the
+        # overrides are the same
+        return _read_pool(paths, cache, workers, select)
+    elif cache is not None:
+        return (_load_entries(path, cache, select) for path in paths)
+    else:
+        # One file at a time, without keeping its entries around
+        return (read_localisation_file(path, select) for path in paths)
+
+
+def _merge(
+    files: Iterable[Iterable[tuple[str, str, int]]], select: KeySelector | None
+) -> dict[str, dict[str, Any]]:
+    localisation: dict[str, dict[str, Any]] = dict()
+
+    # Keys that still have to be found, once there are none left the
+    # other files can't override them and are not read
+    missing: set[str] | None = None
+    if select is not None and select.exact():
+        missing = set(select.keys)
+
+    for entries in files:
+        if missing is not None and not missing:
+            break
+
+        # Add to our dictionary
+        for key, value, version in entries:
+            # Do not add the key if it already exists, this allows us to
+            # override files by first loading the mod, then loading each
+            # game in descending order
+            if key in localisation:
+                continue
+
+            localisation[key] = {
+                "value": value,
+                "version": version,
+            }
+            if missing is not None:
+                missing.discard(key)
+                if not missing:
+                    break
+
+    return localisation
+
+
+def _selector(
+    keys: Collection[str] | Callable[[str], bool] | None,
+    prefixes: Iterable[str] | None,
+) -> KeySelector | None:
+    if keys is None and prefixes is None:
+        return None
+    return KeySelector(keys, prefixes)
 
 
 def generate_localisation(
-    dirs: list[str], language: str = "english"
+    dirs: list[str],
+    language: str = "english",
+    cache: "ParseCache | None" = None,
+    workers: int = 1,
+    keys: Collection[str] | Callable[[str], bool] | None = None,
+    prefixes: Iterable[str] | None = None,
+    references: bool = False,
+    fs: "ModFS | None" = None,
 ) -> dict[str, dict[str, Any]]:
     """generate localisation from list of directories.
 
     Args:
         dirs (list[str]): list of paths to directories where we get load all the localisation files.
         language (str, optional): which language do we get our localisation for. Defaults to "english".
+        cache (ParseCache | None, optional): cache to get the parsed files from, and store them in. Defaults to None.
+        workers (int, optional): how many processes to read the files with, they are still merged in the same order. Defaults to 1.
+        keys (Collection[str] | Callable[[str], bool] | None, optional): only load these keys, or the keys this function returns True for, it must be picklable when workers > 1. Defaults to None.
+        prefixes (Iterable[str] | None, optional): only load the keys that start with one of these. Defaults to None.
+        references (bool, optional): when only some keys are loaded, also load the keys their values reference with $KEY$, so a LocalisationResolver can expand them. Defaults to False.
+        fs (ModFS | None, optional): list the directories through it, to share its listings with other tools. Defaults to None.
 
     Returns:
         dict[str, dict[str, Any]]: a dictionary of dictionaries keyed by the localisation key and holding the value of the localisation and its version.
     """
+    # Will hold ALL the files that we are going to parse
+    paths = localisation_files(dirs, language, fs)
 
-    import io
-    import os
+    select = _selector(keys, prefixes)
+    localisation = _merge(_read_files(paths, cache, workers, select), select)
+    if not references or select is None:
+        return localisation
 
-    localisation: dict[str, dict[str, Any]] = dict()
+    # Keys that were looked for, found or not, so they are not read again
+    asked = set(select.keys) | set(localisation)
+    loaded = localisation
+    while True:
+        # Another pass for the references that were not loaded yet,
+        # only as many as references are nested
+        pending = {
+            m.group("key")
+            for entry in loaded.values()
+            for m in _REFERENCE_RE.finditer(entry["value"])
+        } - asked
+        if not pending:
+            return localisation
+        asked |= pending
 
-    # Set of files that we have seen already, they are added as
-    # we read the files
-    files_seen: set[str] = set()
+        select = KeySelector(pending)
+        loaded = _merge(_read_files(paths, cache, workers, select), select)
+        localisation.update(loaded)
 
-    # Will hold ALL the files that we are going to parse
-    wfd = io.StringIO()
 
-    # Get all the base games ones if given to us
-    for dir in reversed(dirs):
-        for file in os.listdir(dir + "/localisation"):
-            if not file.endswith(f"l_{language}.yml") or file in files_seen:
-                continue
-            with open(f"{dir}/localisation/{file}", "r", encoding="utf-8-sig") as fd:
-                wfd.write((fd.read()))
-                wfd.write("\n")
-
-            # Say we have seen the file
-            files_seen.add(file)
-
-    stream = wfd.getvalue()
-
-    # Lex and Parse
-    lexer = LocalisationLexer()
-    parser = LocalisationParser()
-    result = parser.parse(lexer.tokenize(stream))
-
-    # Create our new dictionary
-    for res in result:
-        # Do not add the key if it already exists, this allows us to
-        # override files by first loading the mod, then loading each
-        # game in descending order
-        if type(res) is not dict or res["key"] in localisation:
+def generate_localisations(
+    dirs: list[str],
+    languages: list[str],
+    cache: "ParseCache | None" = None,
+    workers: int = 1,
+    keys: Collection[str] | Callable[[str], bool] | None = None,
+    prefixes: Iterable[str] | None = None,
+    fs: "ModFS | None" = None,
+) -> dict[str, dict[str, dict[str, Any]]]:
+    """generate localisation for many languages at once, going over the directories a single time and reading the files of all the languages in the same pool.
+
+    Args:
+        dirs (list[str]): list of paths to directories where we get load all the localisation files.
+        languages (list[str]): which languages do we get our localisation for.
+        cache (ParseCache | None, optional): cache to get the parsed files from, and store them in. Defaults to None.
+        workers (int, optional): how many processes to read the files with. Defaults to 1.
+        keys (Collection[str] | Callable[[str], bool] | None, optional): only load these keys, see generate_localisation. Defaults to None.
+        prefixes (Iterable[str] | None, optional): only load the keys that start with one of these. Defaults to None.
+        fs (ModFS | None, optional): list the directories through it, to share its listings with other tools. Defaults to None.
+
+    Returns:
+        dict[str, dict[str, dict[str, Any]]]: for every language, the same dictionary generate_localisation returns for it.
+    """
+    files = _localisation_files(dirs, languages, fs)
+    paths = [path for language in languages for path in files[language]]
+
+    select = _selector(keys, prefixes)
+    read = iter(_read_files(paths, cache, workers, select))
+
+    localisations: dict[str, dict[str, dict[str, Any]]] = dict()
+    for language in languages:
+        # The files of each language come one after the other
+        language_files = islice(read, len(files[language]))
+        localisations[language] = _merge(language_files, select)
+        # Skip what was not merged, if all the keys were found early
+        for _ in language_files:
+            pass
+
+    return localisations
+
+
+def localisation_coverage(
+    localisations: dict[str, dict[str, dict[str, Any]]], reference: str = "english"
+) -> dict[str, dict[str, set[str]]]:
+    """compare the localisation of every language with the one of a reference language.
+
+    Args:
+        localisations (dict[str, dict[str, dict[str, Any]]]): the localisation of every language, like generate_localisations returns it.
+        reference (str, optional): the language the others are translated from. Defaults to "english".
+
+    Returns:
+        dict[str, dict[str, set[str]]]: for every language but the reference, the "missing" keys that are only in the reference and the "outdated" keys whose version is older than in the reference.
+    """
+    base = localisations[reference]
+
+    report: dict[str, dict[str, set[str]]] = dict()
+    for language, localisation in localisations.items():
+        if language == reference:
             continue
 
-        localisation[res["key"]] = {
-            "value": res["value"],
-            "version": res["version"],
+        report[language] = {
+            "missing": base.keys() - localisation.keys(),
+            "outdated": {
+                key
+                for key in base.keys() & localisation.keys()
+                if localisation[key]["version"] < base[key]["version"]
+            },
         }
 
-    return localisation
+    return report
@@ -59,9 +59,61 @@ LINE_COMMENT
 
 from .lexer import SimpleCWLexer
 from .parser import SimpleCWParser, ParseError
+from .scanner import FastCWLexer, decode_file, detect_encoding
+from .fastparser import FastCWParser
+from .events import (
+    START_BLOCK,
+    PAIR,
+    ARRAY_ITEM,
+    END_BLOCK,
+    iter_events,
+    iter_entries,
+    tree_events,
+)
+from .jsonstream import iter_json, iter_ndjson, write_json
+from .lazy import LazyCWFile
+from .compact import CompactTree
+from .query import QueryIndex, query
+from .files import parse_file, lazy_file, map_files, iter_files, parse_files
+
+# Lexer and Parser engines that can be selected by name, they all produce
+# the same tokens and trees and can be mixed with one another
+LEXERS = {
+    "sly": SimpleCWLexer,
+    "fast": FastCWLexer,
+}
+PARSERS = {
+    "sly": SimpleCWParser,
+    "fast": FastCWParser,
+}
 
 __all__ = (
     "SimpleCWLexer",
     "SimpleCWParser",
     "ParseError",
+    "FastCWLexer",
+    "detect_encoding",
+    "decode_file",
+    "FastCWParser",
+    "LEXERS",
+    "PARSERS",
+    "START_BLOCK",
+    "PAIR",
+    "ARRAY_ITEM",
+    "END_BLOCK",
+    "iter_events",
+    "iter_entries",
+    "tree_events",
+    "iter_json",
+    "iter_ndjson",
+    "write_json",
+    "LazyCWFile",
+    "CompactTree",
+    "QueryIndex",
+    "query",
+    "parse_file",
+    "lazy_file",
+    "map_files",
+    "iter_files",
+    "parse_files",
 )
@@ -0,0 +1,289 @@
+from array import array
+from typing import Any, Iterable, Iterator
+
+from Simple_Clausewitz.events import (
+    ARRAY_ITEM,
+    END_BLOCK,
+    PAIR,
+    START_BLOCK,
+    Event,
+    tree_events,
+)
+
+# Kinds of values, every element of a block has one
+_STR = 0  # value is the id of the string
+_INT = 1  # value is the integer itself
+_FLOAT = 2  # value is the index in the floats
+_BOOL = 3  # value is 0 or 1
+_BLOCK = 4  # value is the id of the block
+_OBJECT = 5  # value is the index in the objects, for integers that don't fit
+
+# Key id of the elements of arrays, which have no key
+_NO_KEY = -1
+
+_INT_MIN = -(2**63)
+_INT_MAX = 2**63 - 1
+
+
+class _Storage:
+    """Columns shared by all the blocks of a tree"""
+
+    __slots__ = (
+        "atoms",
+        "keys",
+        "kinds",
+        "values",
+        "floats",
+        "objects",
+        "starts",
+        "lengths",
+    )
+
+    def __init__(self):
+        # Every key and string value, only stored once
+        self.atoms: list[Any] = []
+        # One entry per element, the elements of a block are contiguous
+        self.keys = array("i")
+        self.kinds = array("B")
+        self.values = array("q")
+        self.floats = array("d")
+        self.objects: list[Any] = []
+        # Where the elements of each block start and how many there are,
+        # blocks get their id once they are closed, so the children of a
+        # block always have a smaller id than it
+        self.starts = array("I")
+        self.lengths = array("I")
+
+
+class CompactTree:
+    """Read-only, compact form of what the parsers return.
+
+    Instead of a list of tuples per block and an object per key and value,
+    keys and strings are interned once, every other value is stored in
+    typed array columns and blocks are a range of offsets into them.
+
+    It can be used like the list it was made from: iterating over a map
+    gives (key, value) tuples and iterating over an array gives its values,
+    with blocks being CompactTree in turn, so code like has_mapping works
+    on it as is. It compares equal to the list it was made from.
+    """
+
+    __slots__ = ("_storage", "_block")
+
+    def __init__(self, storage: _Storage, block: int):
+        self._storage = storage
+        self._block = block
+
+    @classmethod
+    def from_events(cls, events: Iterable[Event]) -> "CompactTree":
+        """Build a tree from a stream of events, without ever building
+        the list form of it
+
+        Args:
+            events (Iterable[Event]): the events from iter_events
+
+        Returns:
+            CompactTree: the tree of the whole file
+        """
+        storage = _Storage()
+        atoms = storage.atoms
+        ids: dict[Any, int] = dict()
+
+        def intern(atom: Any) -> int:
+            i = ids.get(atom)
+            if i is None:
+                i = ids[atom] = len(atoms)
+                atoms.append(atom)
+            return i
+
+        def element(key: int, value: Any) -> tuple[int, int, int]:
+            if isinstance(value, str):
+                return key, _STR, intern(value)
+            if isinstance(value, bool):
+                return key, _BOOL, int(value)
+            if isinstance(value, int):
+                if _INT_MIN <= value <= _INT_MAX:
+                    return key, _INT, value
+                storage.objects.append(value)
+                return key, _OBJECT, len(storage.objects) - 1
+            if isinstance(value, float):
+                storage.floats.append(value)
+                return key, _FLOAT, len(storage.floats) - 1
+            storage.objects.append(value)
+            return key, _OBJECT, len(storage.objects) - 1
+
+        # Elements of the blocks that are still open, they can only be
+        # stored once the block is closed so they are contiguous
+        current: list[tuple[int, int, int]] = []
+        stack: list[tuple[list[tuple[int, int, int]], int]] = []
+
+        def close(elements: list[tuple[int, int, int]]) -> int:
+            storage.starts.append(len(storage.kinds))
+            storage.lengths.append(len(elements))
+            for key, kind, value in elements:
+                storage.keys.append(key)
+                storage.kinds.append(kind)
+                storage.values.append(value)
+            return len(storage.starts) - 1
+
+        for kind, key, value in events:
+            if kind == PAIR:
+                current.append(element(intern(key), value))
+            elif kind == ARRAY_ITEM:
+                current.append(element(_NO_KEY, value))
+            elif kind == START_BLOCK:
+                stack.append((current, _NO_KEY if key is None else intern(key)))
+                current = []
+            elif kind == END_BLOCK:
+                block = close(current)
+                current, key = stack.pop()
+                current.append((key, _BLOCK, block))
+
+        return cls(storage, close(current))
+
+    @classmethod
+    def from_list(cls, tree: list[Any]) -> "CompactTree":
+        """Build a tree from what the parsers return
+
+        Args:
+            tree (list[Any]): list of (key, value) tuples
+
+        Returns:
+            CompactTree: the same tree in compact form
+        """
+        return cls.from_events(tree_events(tree))
+
+    def to_list(self) -> list[Any]:
+        """Build the list form of the tree, like the parsers return it
+
+        Returns:
+            list[Any]: list of (key, value) tuples, or of values for arrays
+        """
+        storage = self._storage
+        atoms = storage.atoms
+        # Children always have a smaller id, so they are built first
+        blocks: dict[int, list[Any]] = dict()
+        for block in self._descendants():
+            start = storage.starts[block]
+            result: list[Any] = []
+            for i in range(start, start + storage.lengths[block]):
+                kind = storage.kinds[i]
+                if kind == _BLOCK:
+                    value = blocks.pop(storage.values[i])
+                else:
+                    value = self._scalar(kind, storage.values[i])
+                key = storage.keys[i]
+                result.append(value if key == _NO_KEY else (atoms[key], value))
+            blocks[block] = result
+
+        return blocks[self._block]
+
+    def _descendants(self) -> list[int]:
+        # Ids of this block and all the blocks inside of it, sorted
+        storage = self._storage
+        found = [self._block]
+        pending = [self._block]
+        while pending:
+            block = pending.pop()
+            start = storage.starts[block]
+            for i in range(start, start + storage.lengths[block]):
+                if storage.kinds[i] == _BLOCK:
+                    found.append(storage.values[i])
+                    pending.append(storage.values[i])
+
+        found.sort()
+        return found
+
+    def _scalar(self, kind: int, value: int) -> Any:
+        if kind == _STR:
+            return self._storage.atoms[value]
+        if kind == _INT:
+            return value
+        if kind == _FLOAT:
+            return self._storage.floats[value]
+        if kind == _BOOL:
+            return bool(value)
+        return self._storage.objects[value]
+
+    def _element(self, i: int) -> Any:
+        storage = self._storage
+        kind = storage.kinds[i]
+        if kind == _BLOCK:
+            value = CompactTree(storage, storage.values[i])
+        else:
+            value = self._scalar(kind, storage.values[i])
+
+        key = storage.keys[i]
+        if key == _NO_KEY:
+            return value
+        return (storage.atoms[key], value)
+
+    def _range(self) -> range:
+        start = self._storage.starts[self._block]
+        return range(start, start + self._storage.lengths[self._block])
+
+    def keys(self) -> list[Any]:
+        """Keys of all the entries of a map, in order and with duplicates
+
+        Returns:
+            list[Any]: the keys
+        """
+        storage = self._storage
+        return [storage.atoms[storage.keys[i]] for i in self._range()]
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Value of the first entry with the given key
+
+        Args:
+            key (Any): key of the entry
+            default (Any, optional): what to return if there is no entry with the key. Defaults to None.
+
+        Returns:
+            Any: the value of the entry, a CompactTree if it is a block
+        """
+        for i in self._find(key):
+            return self._element(i)[1]
+        return default
+
+    def get_all(self, key: Any) -> list[Any]:
+        """Values of all the entries with the given key
+
+        Args:
+            key (Any): key of the entries
+
+        Returns:
+            list[Any]: the values of the entries, in order
+        """
+        return [self._element(i)[1] for i in self._find(key)]
+
+    def _find(self, key: Any) -> Iterator[int]:
+        storage = self._storage
+        for i in self._range():
+            k = storage.keys[i]
+            if k != _NO_KEY and storage.atoms[k] == key:
+                yield i
+
+    def __len__(self) -> int:
+        return self._storage.lengths[self._block]
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in self._range():
+            yield self._element(i)
+
+    def __getitem__(self, index: int | slice) -> Any:
+        if isinstance(index, slice):
+            return [self._element(i) for i in self._range()[index]]
+        return self._element(self._range()[index])
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, CompactTree):
+            return self.to_list() == other.to_list()
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+
+    # Mutable like the lists it stands for, as far as hashing goes
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return repr(self.to_list())
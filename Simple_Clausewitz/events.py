@@ -0,0 +1,198 @@
+from typing import Any, Iterable, Iterator
+
+from sly.lex import Token
+
+from Simple_Clausewitz.fastparser import (
+    _ARRAY,
+    _FIELDS,
+    _KEY,
+    _OPEN,
+    _PENDING,
+    _SCALARS,
+    _SPECIFIER,
+    _VALUE,
+    _error,
+)
+from Simple_Clausewitz.parser import ParseError
+
+# Kinds of events, every event is a (kind, key, value) tuple
+START_BLOCK = "start_block"  # (START_BLOCK, key, None), key is None inside arrays
+PAIR = "pair"  # (PAIR, key, value)
+ARRAY_ITEM = "array_item"  # (ARRAY_ITEM, None, value)
+END_BLOCK = "end_block"  # (END_BLOCK, None, None)
+
+Event = tuple[str, Any, Any]
+
+
+def iter_events(tokens: Iterable[Token]) -> Iterator[Event]:
+    """Parse a stream of tokens into a stream of events, without building
+    the tree, only the depth of the blocks we are inside of is kept.
+
+    It follows the same grammar as FastCWParser and raises the same
+    ParseError messages, but only when it gets to the bad token, so the
+    events before it have already been handed out.
+
+    Blocks can't be told to be maps or arrays from their START_BLOCK,
+    maps only contain PAIR events and arrays only ARRAY_ITEM events, and
+    empty blocks contain neither.
+
+    Args:
+        tokens (Iterable[Token]): the tokens from SimpleCWLexer or FastCWLexer
+
+    Raises:
+        ParseError: on the first token that is not valid
+
+    Yields:
+        Iterator[Event]: (kind, key, value) tuples
+    """
+    # States to go back to after closing each block we are inside of
+    stack: list[int] = []
+    state = _KEY
+    key = None
+
+    for tok in tokens:
+        kind = tok.type
+
+        if state == _PENDING:
+            if kind == "SPECIFIER":
+                state = _VALUE
+                continue
+
+            yield (ARRAY_ITEM, None, key)
+            state = _ARRAY
+
+        if state == _ARRAY:
+            if kind in _FIELDS or kind in _SCALARS:
+                yield (ARRAY_ITEM, None, tok.value)
+            elif kind == "{":
+                stack.append(_ARRAY)
+                state = _OPEN
+                yield (START_BLOCK, None, None)
+            elif kind == "}":
+                state = stack.pop()
+                yield (END_BLOCK, None, None)
+            else:
+                _error(tok)
+
+        elif state == _KEY:
+            if kind in _FIELDS:
+                key = tok.value
+                state = _SPECIFIER
+            elif kind == "}" and stack:
+                state = stack.pop()
+                yield (END_BLOCK, None, None)
+            else:
+                _error(tok)
+
+        elif state == _SPECIFIER:
+            if kind != "SPECIFIER":
+                _error(tok)
+            state = _VALUE
+
+        elif state == _VALUE:
+            if kind in _FIELDS or kind in _SCALARS:
+                state = _KEY
+                yield (PAIR, key, tok.value)
+            elif kind == "{":
+                stack.append(_KEY)
+                state = _OPEN
+                yield (START_BLOCK, key, None)
+            else:
+                _error(tok)
+
+        elif state == _OPEN:
+            if kind in _FIELDS:
+                # Only the token after it can tell if this is a key
+                key = tok.value
+                state = _PENDING
+            elif kind in _SCALARS:
+                state = _ARRAY
+                yield (ARRAY_ITEM, None, tok.value)
+            elif kind == "{":
+                stack.append(_ARRAY)
+                yield (START_BLOCK, None, None)
+            elif kind == "}":
+                state = stack.pop()
+                yield (END_BLOCK, None, None)
+            else:
+                _error(tok)
+
+    if state != _KEY or stack:
+        raise ParseError("Syntax error at EOF")
+
+
+def iter_entries(events: Iterable[Event]) -> Iterator[tuple[Any, Any]]:
+    """Build the top-level (key, value) tuples from a stream of events one
+    at a time, so only a single entry is in memory at once.
+
+    Args:
+        events (Iterable[Event]): the events from iter_events
+
+    Yields:
+        Iterator[tuple[Any, Any]]: the same tuples that would be in the list
+        returned by the parsers
+    """
+    # The block we are adding to, and the ones we are inside of
+    current: list[Any] = []
+    stack: list[list[Any]] = []
+    top = None
+
+    for kind, key, value in events:
+        if kind == PAIR:
+            if stack:
+                current.append((key, value))
+            else:
+                yield (key, value)
+        elif kind == ARRAY_ITEM:
+            current.append(value)
+        elif kind == START_BLOCK:
+            block: list[Any] = []
+            if stack:
+                current.append(block if key is None else (key, block))
+            stack.append(current)
+            current = block
+            if len(stack) == 1:
+                top = key
+        elif kind == END_BLOCK:
+            block = current
+            current = stack.pop()
+            if not stack:
+                yield (top, block)
+
+
+def tree_events(tree: list[Any]) -> Iterator[Event]:
+    """The events iter_events would have produced for a parsed tree, so
+    whatever takes events can also take trees, like the ones from a cache
+
+    Args:
+        tree (list[Any]): list of (key, value) tuples, like the parsers return
+
+    Yields:
+        Iterator[Event]: (kind, key, value) tuples
+    """
+    # Going over it with an explicit stack like the parser
+    stack: list[Iterator[Any]] = [iter(tree)]
+    in_array: list[bool] = [False]
+    while stack:
+        for elem in stack[-1]:
+            if in_array[-1]:
+                key, value = None, elem
+            else:
+                key, value = elem
+
+            if isinstance(value, list):
+                yield (START_BLOCK, key, None)
+                stack.append(iter(value))
+                # Maps are lists of tuples, empty blocks can be either
+                in_array.append(bool(value) and not isinstance(value[0], tuple))
+                break
+
+            if in_array[-1]:
+                yield (ARRAY_ITEM, None, value)
+            else:
+                yield (PAIR, key, value)
+        else:
+            stack.pop()
+            in_array.pop()
+            if stack:
+                yield (END_BLOCK, None, None)
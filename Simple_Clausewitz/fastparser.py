@@ -0,0 +1,194 @@
+from typing import Any, Iterable, Iterator
+
+from sly.lex import Token
+
+from Simple_Clausewitz.parser import ParseError
+
+# States of the parser
+_KEY = 0  # Expecting the key of a pair, or the end of the block
+_SPECIFIER = 1  # Expecting the '=' between a key and its value
+_VALUE = 2  # Expecting the value of a pair
+_OPEN = 3  # Just after a '{', we still don't know if it is a map or array
+_PENDING = 4  # First element of a block that can be either a key or a value
+_ARRAY = 5  # Expecting values, or the end of the block
+
+# Tokens that can only be values
+_SCALARS = {"DATE", "BOOL", "FLOAT"}
+# Tokens that can be either keys or values
+_FIELDS = {"INTEGER", "STRING"}
+
+
+def _error(tok: Token):
+    raise ParseError(
+        (
+            "Token parse error: token=%s type=%s line=%s index=%s"
+            % (tok.value, tok.type, tok.lineno, tok.index)
+        ),
+        tok.lineno,
+    )
+
+
+def _resync(tok: Token | None, tokens: Iterator[Token], depth: int) -> Any:
+    # Skip tokens, starting with tok, until a key followed by '=' at the
+    # top-level, and give the key, or None if the tokens ran out
+    candidate = None
+    while tok is not None:
+        kind = tok.type
+        if kind == "SPECIFIER" and candidate is not None:
+            return candidate.value
+        candidate = None
+        if kind == "{":
+            depth += 1
+        elif kind == "}":
+            # Braces closed too many times don't go under the top-level
+            depth = max(0, depth - 1)
+        elif depth == 0 and kind in _FIELDS:
+            candidate = tok
+        tok = next(tokens, None)
+
+    return None
+
+
+class FastCWParser:
+    """Drop-in replacement for SimpleCWParser that doesn't go through sly.
+
+    It is a hand-written parser that keeps the blocks it is inside of in
+    an explicit stack instead of recursing, so it has no nesting limit.
+    It builds the exact same list of (key, value) tuples, with maps as
+    lists of tuples and arrays as lists of values, and raises the same
+    ParseError messages.
+
+    It can also recover from errors: the error is recorded, the top-level
+    entry it is in is dropped, and parsing goes on from the next key = at
+    the top-level, so the other entries of a broken file are still there.
+    """
+
+    tokens = {"STRING", "INTEGER", "FLOAT", "BOOL", "DATE", "SPECIFIER"}
+
+    def parse(
+        self, tokens: Iterable[Token], errors: list[ParseError] | None = None
+    ) -> list[Any]:
+        """Parse a stream of tokens
+
+        Args:
+            tokens (Iterable[Token]): the tokens from SimpleCWLexer or FastCWLexer
+            errors (list[ParseError] | None, optional): recover from errors and add them to this list instead of raising them. Defaults to None.
+
+        Raises:
+            ParseError: on the first token that is not valid, if errors is not given
+
+        Returns:
+            list[Any]: list of (key, value) tuples, without the top-level
+            entries that had errors in them when recovering
+        """
+        result: list[Any] = []
+        # The list we are adding to, and the ones we are inside of
+        # along with the state to go back to after closing the block
+        current = result
+        stack: list[tuple[list[Any], int]] = []
+        state = _KEY
+        key = None
+        block: list[Any]
+        tok = None
+
+        # Every error we recover from starts the loop again
+        tokens = iter(tokens)
+        while True:
+            try:
+                for tok in tokens:
+                    kind = tok.type
+
+                    if state == _PENDING:
+                        if kind == "SPECIFIER":
+                            state = _VALUE
+                            continue
+
+                        # It was the first value of an array, handle the current
+                        # token like any other inside an array
+                        current.append(key)
+                        state = _ARRAY
+
+                    if state == _ARRAY:
+                        if kind in _FIELDS or kind in _SCALARS:
+                            current.append(tok.value)
+                        elif kind == "{":
+                            block = []
+                            current.append(block)
+                            stack.append((current, _ARRAY))
+                            current = block
+                            state = _OPEN
+                        elif kind == "}":
+                            current, state = stack.pop()
+                        else:
+                            _error(tok)
+
+                    elif state == _KEY:
+                        if kind in _FIELDS:
+                            key = tok.value
+                            state = _SPECIFIER
+                        elif kind == "}" and stack:
+                            current, state = stack.pop()
+                        else:
+                            _error(tok)
+
+                    elif state == _SPECIFIER:
+                        if kind != "SPECIFIER":
+                            _error(tok)
+                        state = _VALUE
+
+                    elif state == _VALUE:
+                        if kind in _FIELDS or kind in _SCALARS:
+                            current.append((key, tok.value))
+                            state = _KEY
+                        elif kind == "{":
+                            block = []
+                            current.append((key, block))
+                            stack.append((current, _KEY))
+                            current = block
+                            state = _OPEN
+                        else:
+                            _error(tok)
+
+                    elif state == _OPEN:
+                        if kind in _FIELDS:
+                            # Only the token after it can tell if this is a key
+                            key = tok.value
+                            state = _PENDING
+                        elif kind in _SCALARS:
+                            current.append(tok.value)
+                            state = _ARRAY
+                        elif kind == "{":
+                            block = []
+                            current.append(block)
+                            stack.append((current, _ARRAY))
+                            current = block
+                        elif kind == "}":
+                            current, state = stack.pop()
+                        else:
+                            _error(tok)
+                break
+            except ParseError as e:
+                if errors is None:
+                    raise
+                errors.append(e)
+                # The top-level entry the error is in is the last one
+                if stack:
+                    result.pop()
+                key = _resync(tok, tokens, len(stack))
+                if key is None:
+                    return result
+                current = result
+                stack = []
+                state = _VALUE
+
+        if state != _KEY or stack:
+            error = ParseError(
+                "Syntax error at EOF", None if tok is None else tok.lineno
+            )
+            if errors is None:
+                raise error
+            errors.append(error)
+            if stack:
+                result.pop()
+
+        return result
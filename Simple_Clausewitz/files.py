@@ -0,0 +1,253 @@
+import mmap
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, TypeVar
+
+from sly.lex import Token
+
+from Simple_Clausewitz.compact import CompactTree
+from Simple_Clausewitz.events import iter_events
+from Simple_Clausewitz.fastparser import FastCWParser
+from Simple_Clausewitz.lazy import LazyCWFile
+from Simple_Clausewitz.parser import ParseError
+from Simple_Clausewitz.scanner import FastCWLexer, decode_file
+
+if TYPE_CHECKING:
+    from hw_utils.cache import ParseCache
+
+T = TypeVar("T")
+
+
+def _parse(
+    tokens: Iterable[Token], compact: bool, errors: list[ParseError] | None
+) -> list[Any] | CompactTree:
+    if errors is not None:
+        # Only the parser can recover from errors
+        tree = FastCWParser().parse(tokens, errors)
+        return CompactTree.from_list(tree) if compact else tree
+    if compact:
+        return CompactTree.from_events(iter_events(tokens))
+    return FastCWParser().parse(tokens)
+
+
+def parse_file(
+    path: str,
+    cache: "ParseCache | None" = None,
+    compact: bool = False,
+    errors: list[ParseError] | None = None,
+) -> list[Any] | CompactTree:
+    """Parse a Clausewitz file
+
+    Args:
+        path (str): path to the file
+        cache (ParseCache | None, optional): cache to get the result from, and store it in. Defaults to None.
+        compact (bool, optional): return a CompactTree instead of a list, which takes a fraction of the memory. Defaults to False.
+        errors (list[ParseError] | None, optional): recover from errors and add them to this list, along with the illegal characters, with the path as their file, see FastCWParser. Defaults to None.
+
+    Raises:
+        ParseError: if the file is not valid and errors is not given
+
+    Returns:
+        list[Any] | CompactTree: the same list of (key, value) tuples the
+        parsers return, or the CompactTree of it
+    """
+    if cache is not None:
+        # The cache reads the file, so it knows what was parsed
+        kind = "clausewitz-compact" if compact else "clausewitz"
+        if errors is None:
+            return cache.load(
+                path, kind, lambda data: _parse_buffer(data, path, compact, None)
+            )
+
+        def recover(data: bytes) -> tuple[list[Any] | CompactTree, list[ParseError]]:
+            # The errors are stored along with what was parsed
+            found: list[ParseError] = []
+            return _parse_buffer(data, path, compact, found), found
+
+        tree, found = cache.load(path, kind + "-recover", recover)
+        errors.extend(found)
+        return tree
+
+    with open(path, "rb") as fd:
+        # mmap can't map empty files
+        if os.fstat(fd.fileno()).st_size == 0:
+            return _parse_buffer(b"", path, compact, errors)
+        # Decoded straight out of the mapped file, without copying its
+        # bytes first
+        with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return _parse_buffer(buffer, path, compact, errors)
+
+
+def _parse_buffer(
+    buffer: bytes | mmap.mmap,
+    path: str,
+    compact: bool,
+    errors: list[ParseError] | None,
+) -> list[Any] | CompactTree:
+    # Errors of this file are the ones added after these
+    start = 0 if errors is None else len(errors)
+    # The whole file is lexed faster once it is decoded
+    tree = _parse(FastCWLexer(errors).tokenize(decode_file(buffer)), compact, errors)
+
+    if errors is not None:
+        for error in errors[start:]:
+            error.file = path
+
+    return tree
+
+
+def _parse_recovering(
+    path: str, cache: "ParseCache | None" = None, compact: bool = False
+) -> tuple[list[Any] | CompactTree, list[ParseError]]:
+    # parse_file() that gives its errors back, so it can go through
+    # map_files() and the cache
+    errors: list[ParseError] = []
+    return parse_file(path, cache, compact, errors), errors
+
+
+@contextmanager
+def lazy_file(path: str, cache: "ParseCache | None" = None) -> Iterator[LazyCWFile]:
+    """Index a Clausewitz file with LazyCWFile
+
+    When a cache is given the index is taken from it if possible, otherwise
+    it is stored in it once it is no longer used, along with every entry
+    that was parsed while using it.
+
+    Args:
+        path (str): path to the file
+        cache (ParseCache | None, optional): cache to get the index from, and store it in. Defaults to None.
+
+    Raises:
+        ParseError: if the top-level of the file is not valid
+
+    Yields:
+        Iterator[LazyCWFile]: the index of the file
+    """
+    lazy = cache.get(path, "clausewitz-lazy") if cache is not None else None
+    if lazy is not None:
+        yield lazy
+        return
+
+    # Bytes and not a mmap, so the index can be pickled into the cache
+    with open(path, "rb") as fd:
+        # Taken before reading, like ParseCache.load does
+        st = os.fstat(fd.fileno())
+        lazy = LazyCWFile(fd.read())
+
+    try:
+        yield lazy
+    finally:
+        if cache is not None:
+            cache.put(path, "clausewitz-lazy", lazy, lazy.text, st)
+
+
+def _call(
+    func: Callable[[str], T], path: str
+) -> tuple[str, T | None, Exception | None]:
+    try:
+        return path, func(path), None
+    except Exception as e:
+        return path, None, e
+
+
+def map_files(
+    func: Callable[[str], T], paths: Iterable[str], workers: int = 1
+) -> list[tuple[str, T | None, Exception | None]]:
+    """Call a function on every file, spread across a pool of processes
+
+    An exception raised for a file, like ParseError, is returned along with
+    it instead of stopping the other files.
+
+    Args:
+        func (Callable[[str], T]): function taking the path to a file, it must
+        be picklable, so defined at the top-level of a module, when workers > 1
+        paths (Iterable[str]): paths to the files
+        workers (int, optional): how many processes to use, 1 calls func in this process. Defaults to 1.
+
+    Returns:
+        list[tuple[str, T | None, Exception | None]]: (path, result, exception)
+        tuples in the same order as the paths, result is None if there was an
+        exception and exception is None if there was not
+    """
+    paths = list(paths)
+    if workers <= 1 or len(paths) <= 1:
+        return [_call(func, path) for path in paths]
+
+    # Send files in chunks, so there is less back and forth for small files
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(partial(_call, func), paths, chunksize=chunksize))
+
+
+def iter_files(
+    func: Callable[[str], T], paths: Iterable[str], workers: int = 1
+) -> Iterator[tuple[str, T | None, Exception | None]]:
+    """Call a function on every file like map_files, but hand out every
+    result as soon as it is next in order
+
+    Only a couple of files per process are being worked on at a time, so
+    the results that wait for a slower file before them stay few, and
+    the results can be written out while the other files are going.
+    Stopping early, like breaking out of the loop, cancels the files that
+    were not started yet.
+
+    Args:
+        func (Callable[[str], T]): function taking the path to a file, it must
+        be picklable, so defined at the top-level of a module, when workers > 1
+        paths (Iterable[str]): paths to the files
+        workers (int, optional): how many processes to use, 1 calls func in this process. Defaults to 1.
+
+    Yields:
+        Iterator[tuple[str, T | None, Exception | None]]: (path, result,
+        exception) tuples in the same order as the paths, like map_files
+    """
+    if workers <= 1:
+        for path in paths:
+            yield _call(func, path)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque[Future] = deque()
+        try:
+            for path in paths:
+                pending.append(executor.submit(_call, func, path))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Stopped early, the files that were not started are not needed
+            for future in pending:
+                future.cancel()
+
+
+def parse_files(
+    paths: Iterable[str],
+    workers: int = 1,
+    cache: "ParseCache | None" = None,
+    compact: bool = False,
+    recover: bool = False,
+) -> list[tuple[str, Any, Exception | None]]:
+    """Parse many Clausewitz files, spread across a pool of processes
+
+    Args:
+        paths (Iterable[str]): paths to the files
+        workers (int, optional): how many processes to use. Defaults to 1.
+        cache (ParseCache | None, optional): cache to get the results from, and store them in. Defaults to None.
+        compact (bool, optional): parse every file into a CompactTree. Defaults to False.
+        recover (bool, optional): recover from the errors in the files, see parse_file. Defaults to False.
+
+    Returns:
+        list[tuple[str, Any, Exception | None]]: (path, result, exception)
+        tuples in the same order as the paths, like map_files, the result
+        is the list or the CompactTree, or when recovering a (tree, errors)
+        tuple with the ParseError of every error in the file
+    """
+    if recover:
+        parse = partial(_parse_recovering, cache=cache, compact=compact)
+    else:
+        parse = partial(parse_file, cache=cache, compact=compact)
+    return map_files(parse, paths, workers)
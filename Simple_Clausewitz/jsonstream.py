@@ -0,0 +1,131 @@
+import json
+from typing import Any, Iterable, Iterator, TextIO
+
+from Simple_Clausewitz.events import ARRAY_ITEM, END_BLOCK, PAIR, START_BLOCK, Event
+
+# Pieces are joined into chunks of about this many characters before
+# they are handed out, so writing them is not one call per value
+_CHUNK_SIZE = 64 * 1024
+
+
+def _chunks(pieces: Iterable[str], lines: bool = False) -> Iterator[str]:
+    # With lines, chunks only end at the end of a line, values are
+    # encoded without newlines so only the end of an entry has one
+    buffer: list[str] = []
+    size = 0
+    # How many pieces of the buffer make whole lines
+    whole = 0
+    try:
+        for piece in pieces:
+            buffer.append(piece)
+            size += len(piece)
+            if lines and piece[-1] == "\n":
+                whole = len(buffer)
+            if size >= _CHUNK_SIZE and (not lines or whole == len(buffer)):
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+                whole = 0
+    except Exception:
+        # The lines before the error are still handed out
+        if whole:
+            yield "".join(buffer[:whole])
+        raise
+
+    if buffer:
+        yield "".join(buffer)
+
+
+def _pieces(events: Iterable[Event], file: str | None) -> Iterator[str]:
+    dumps = json.dumps
+
+    # Top-level entries are a line each when there is a file to tag them
+    # with, or the elements of a single list otherwise
+    lines = file is not None
+    if lines:
+        line = '{"file": %s, "key": ' % dumps(file)
+    else:
+        yield "["
+
+    # Whether something was written in each block we are inside of, and
+    # whether the block is the value of a pair, which is a list itself
+    written: list[bool] = [False]
+    keyed: list[bool] = []
+
+    for kind, key, value in events:
+        if kind == END_BLOCK:
+            written.pop()
+            if keyed.pop():
+                yield "]}\n" if lines and len(written) == 1 else "]]"
+            else:
+                yield "]"
+            continue
+
+        separator = ", " if written[-1] else ""
+        written[-1] = True
+        if lines and len(written) == 1:
+            start, middle, end = line, ', "value": ', "}\n"
+        else:
+            start, middle, end = separator + "[", ", ", "]"
+
+        if kind == PAIR:
+            yield start + dumps(key) + middle + dumps(value) + end
+        elif kind == ARRAY_ITEM:
+            yield separator + dumps(value)
+        elif kind == START_BLOCK:
+            if key is None:
+                yield separator + "["
+            else:
+                yield start + dumps(key) + middle + "["
+            keyed.append(key is not None)
+            written.append(False)
+
+    if not lines:
+        yield "]"
+
+
+def iter_json(events: Iterable[Event]) -> Iterator[str]:
+    """Encode a stream of events as the JSON of the tree they make, as it
+    comes, without building the tree
+
+    The JSON is the same json.dumps gives for what the parsers return,
+    (key, value) tuples are lists of two elements.
+
+    Args:
+        events (Iterable[Event]): the events from iter_events or tree_events
+
+    Yields:
+        Iterator[str]: chunks of the JSON text, one after the other
+    """
+    return _chunks(_pieces(events, None))
+
+
+def iter_ndjson(events: Iterable[Event], file: str) -> Iterator[str]:
+    """Encode a stream of events as one line of JSON per top-level entry
+
+    Every line is an object like {"file": file, "key": key, "value": value}
+    where the value is encoded like iter_json does. Chunks always end at
+    the end of a line, so if the events stop on a ParseError every line
+    that was handed out is whole.
+
+    Args:
+        events (Iterable[Event]): the events from iter_events or tree_events
+        file (str): what to tag the entries with, like the path of the file
+
+    Yields:
+        Iterator[str]: chunks of the lines, one after the other
+    """
+    return _chunks(_pieces(events, file), lines=True)
+
+
+def write_json(events: Iterable[Event], out: TextIO, file: str | None = None) -> None:
+    """Write the JSON of a stream of events to a file as it is encoded
+
+    Args:
+        events (Iterable[Event]): the events from iter_events or tree_events
+        out (TextIO): where to write the JSON, like sys.stdout
+        file (str | None, optional): write one line per top-level entry tagged with this, see iter_ndjson. Defaults to None.
+    """
+    chunks = iter_json(events) if file is None else iter_ndjson(events, file)
+    for chunk in chunks:
+        out.write(chunk)
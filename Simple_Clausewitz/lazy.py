@@ -0,0 +1,316 @@
+import re
+import sys
+from typing import Any, Iterator
+
+from Simple_Clausewitz.fastparser import FastCWParser
+from Simple_Clausewitz.parser import ParseError
+from Simple_Clausewitz.scanner import FastCWLexer, detect_encoding
+
+# Only what can hide or change the depth of the braces, quoted strings
+# and comments can contain braces that don't count
+_BRACES_RE = re.compile(r'"[^"]*"|\#[^\n]*|[{}]')
+_BRACES_BYTES_RE = re.compile(_BRACES_RE.pattern.encode())
+
+
+class LazyCWFile:
+    """Index of the top-level entries of a Clausewitz file that only
+    parses an entry the first time it is asked for.
+
+    Creating it does a single scan of the text that only lexes the keys
+    and values at the top-level and skips over blocks by counting their
+    braces, remembering where each entry starts and ends.
+
+    Blocks can be indexed in turn with block(), which gives a LazyCWFile
+    over the inside of the block, so only the children that are asked
+    for in it are parsed.
+
+    The text can also be the bytes of the file, then only the strings of
+    the entries that are parsed get decoded, see FastCWLexer.
+    """
+
+    def __init__(
+        self,
+        text: str | bytes,
+        lineno: int = 1,
+        start: int = 0,
+        end: int | None = None,
+        encoding: str | None = None,
+    ):
+        """Index the top-level entries of a Clausewitz file
+
+        Args:
+            text (str | bytes): Clausewitz script, or the bytes of it.
+            lineno (int, optional): line number of the start of the text. Defaults to 1.
+            start (int, optional): index where the entries start. Defaults to 0.
+            end (int | None, optional): index where the entries end. Defaults to the end of the text.
+            encoding (str | None, optional): encoding of bytes, detected with detect_encoding() if not given.
+
+        Raises:
+            ParseError: if the top-level of the text is not made of (key, value) pairs
+            or a block is never closed
+        """
+        if not isinstance(text, str) and encoding is None:
+            encoding, bom = detect_encoding(text)
+            start = max(start, bom)
+
+        self.text = text
+        self.encoding = encoding
+        self.lineno = lineno
+        self.start = start
+        self.end = len(text) if end is None else end
+
+        # For every entry, its key, where its key starts and where its
+        # value starts and ends, and the lines the key and value are on
+        self._keys: list[Any] = []
+        self._spans: list[tuple[int, int, int, int, int]] = []
+        # Index of the entries of each key, in the order they show up
+        self._index: dict[Any, list[int]] = dict()
+        # Entries and blocks that were already parsed and indexed
+        self._values: dict[int, Any] = dict()
+        self._blocks: dict[int, LazyCWFile] = dict()
+
+        self._scan()
+
+    def _scan(self):
+        text = self.text
+        # Illegal characters are only printed once the scan went through,
+        # on an error the parser prints them, with the ones of the skipped
+        # blocks, like parsing everything would have
+        errors: list[ParseError] = []
+        lexer = FastCWLexer(errors)
+        pos = self.start
+        # 0 = expecting a key, 1 = expecting '=', 2 = expecting a value
+        state = 0
+        key = None
+        key_start = 0
+        key_lineno = lineno = self.lineno
+
+        while pos is not None:
+            tokens = lexer.tokenize(text, lineno, pos, self.end, self.encoding)
+            pos = None
+
+            for tok in tokens:
+                kind = tok.type
+                if state == 0:
+                    if kind != "STRING" and kind != "INTEGER":
+                        self._error()
+                    key = tok.value
+                    key_start = tok.index
+                    key_lineno = tok.lineno
+                    state = 1
+                elif state == 1:
+                    if kind != "SPECIFIER":
+                        self._error()
+                    state = 2
+                elif kind == "{":
+                    # Skip to the matching brace and continue from there
+                    pos = self._skip_block(tok.end)
+                    self._add(key, key_start, tok.index, pos, key_lineno, tok.lineno)
+                    # Only the skipped block is counted, so every newline
+                    # of the text is counted once
+                    newline = "\n" if isinstance(text, str) else b"\n"
+                    lineno = tok.lineno + text.count(newline, tok.end, pos)
+                    state = 0
+                    break
+                elif kind in FastCWParser.tokens and kind != "SPECIFIER":
+                    # Scalars are already parsed by the lexer
+                    self._values[len(self._keys)] = tok.value
+                    self._add(
+                        key, key_start, tok.index, tok.end, key_lineno, tok.lineno
+                    )
+                    state = 0
+                else:
+                    self._error()
+
+        if state != 0:
+            self._error()
+
+        for e in errors:
+            print(e, file=sys.stderr)
+
+    def _skip_block(self, pos: int) -> int:
+        depth = 1
+        if isinstance(self.text, str):
+            braces, opening, closing = _BRACES_RE, "{", "}"
+        else:
+            braces, opening, closing = _BRACES_BYTES_RE, b"{", b"}"
+
+        for m in braces.finditer(self.text, pos, self.end):
+            brace = m.group()
+            if brace == opening:
+                depth += 1
+            elif brace == closing:
+                depth -= 1
+                if depth == 0:
+                    return m.end()
+
+        self._error()
+        return self.end
+
+    def _add(
+        self,
+        key: Any,
+        key_start: int,
+        value_start: int,
+        value_end: int,
+        key_lineno: int,
+        value_lineno: int,
+    ):
+        self._index.setdefault(key, []).append(len(self._keys))
+        self._keys.append(key)
+        self._spans.append(
+            (key_start, value_start, value_end, key_lineno, value_lineno)
+        )
+
+    def _error(self):
+        # Let the parser find the exact token and raise the same error
+        # that parsing everything would have raised
+        FastCWParser().parse(
+            FastCWLexer().tokenize(
+                self.text, self.lineno, self.start, self.end, self.encoding
+            )
+        )
+        raise ParseError("Syntax error")
+
+    def _value(self, i: int) -> Any:
+        if i not in self._values:
+            key_start, _, value_end, key_lineno, _ = self._spans[i]
+            tokens = FastCWLexer().tokenize(
+                self.text,
+                key_lineno,
+                key_start,
+                value_end,
+                self.encoding,
+            )
+            self._values[i] = FastCWParser().parse(tokens)[0][1]
+
+        return self._values[i]
+
+    def _block(self, i: int) -> Any:
+        """Return the LazyCWFile for the block of the i-th entry, or its
+        value if it is not a block of (key, value) pairs"""
+        if i in self._blocks:
+            return self._blocks[i]
+
+        _, value_start, value_end, _, value_lineno = self._spans[i]
+        if self.text[value_start : value_start + 1] not in ("{", b"{"):
+            return self._value(i)
+
+        # Only blocks that start with a key = have entries to index,
+        # arrays are parsed whole, the illegal characters are printed
+        # when the block is scanned or parsed
+        tokens = FastCWLexer([]).tokenize(
+            self.text, value_lineno, value_start + 1, value_end - 1, self.encoding
+        )
+        first = next(tokens, None)
+        second = next(tokens, None)
+        tokens.close()
+        if first is not None and (
+            first.type not in ("STRING", "INTEGER")
+            or second is None
+            or second.type != "SPECIFIER"
+        ):
+            return self._value(i)
+
+        # An error inside the block is raised from its own scan, the
+        # same one parsing the value would have raised
+        block = LazyCWFile(
+            self.text,
+            value_lineno,
+            value_start + 1,
+            value_end - 1,
+            self.encoding,
+        )
+        self._blocks[i] = block
+        return block
+
+    def keys(self) -> list[Any]:
+        """Keys of all the top-level entries, in order and with duplicates
+
+        Returns:
+            list[Any]: the keys
+        """
+        return list(self._keys)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Parse the value of the first entry with the given key
+
+        Args:
+            key (Any): key of the entry
+            default (Any, optional): what to return if there is no entry with the key. Defaults to None.
+
+        Returns:
+            Any: the value of the entry, like the parsers would return it
+        """
+        if key not in self._index:
+            return default
+        return self._value(self._index[key][0])
+
+    def get_all(self, key: Any) -> list[Any]:
+        """Parse the values of all entries with the given key
+
+        Args:
+            key (Any): key of the entries
+
+        Returns:
+            list[Any]: the values of the entries, in order
+        """
+        return [self._value(i) for i in self._index.get(key, [])]
+
+    def block(self, key: Any) -> "LazyCWFile":
+        """Index the block of the first entry with the given key
+
+        Args:
+            key (Any): key of the entry
+
+        Raises:
+            KeyError: if there is no entry with the key
+            TypeError: if the value of the entry is not a block
+
+        Returns:
+            LazyCWFile: index of the entries inside the block
+        """
+        block = self._block(self._index[key][0])
+        if not isinstance(block, LazyCWFile):
+            raise TypeError("%s is not a block" % key)
+        return block
+
+    def child(self, key: Any, name: Any, default: Any = None) -> Any:
+        """Parse the first child with the given name of the first entry
+        with the given key, without parsing the rest of the entry
+
+        Args:
+            key (Any): key of the entry
+            name (Any): key of the child inside the entry
+            default (Any, optional): what to return if there is no such child. Defaults to None.
+
+        Returns:
+            Any: the value of the child, like the parsers would return it
+        """
+        if key not in self._index:
+            return default
+        return self.block(key).get(name, default)
+
+    def blocks(self) -> Iterator[tuple[Any, Any]]:
+        """Go over all top-level entries, indexing the ones that are blocks
+
+        Yields:
+            Iterator[tuple[Any, Any]]: (key, value) tuples where the value is
+            a LazyCWFile if the entry is a block, or the value itself otherwise
+        """
+        for i, key in enumerate(self._keys):
+            yield key, self._block(i)
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._value(self._index[key][0])
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> Iterator[tuple[Any, Any]]:
+        # Same (key, value) tuples as the parsers, parsing everything
+        for i, key in enumerate(self._keys):
+            yield key, self._value(i)
@@ -1,3 +1,5 @@
+import sys
+
 from sly import Lexer
 
 
@@ -5,7 +7,8 @@ class SimpleCWLexer(Lexer):
     tokens = {STRING, INTEGER, FLOAT, BOOL, DATE, SPECIFIER}
 
     literals = {"{", "}"}
-    ignore = " \t"
+    # Carriage returns too, game files have CRLF line endings
+    ignore = " \t\r"
 
     SPECIFIER = r"="
 
@@ -47,5 +50,6 @@ class SimpleCWLexer(Lexer):
     ignore_comment = r"\#.*"
 
     def error(self, t):
-        print("Illegal Character '%s'" % t.value[0])
+        # Not to stdout, where the output of the tools goes
+        print("Illegal Character '%s'" % t.value[0], file=sys.stderr)
         self.index += 1
@@ -4,8 +4,11 @@ from Simple_Clausewitz.lexer import SimpleCWLexer
 
 
 class ParseError(Exception):
-    def __init__(self, message):
+    def __init__(self, message, lineno: int | None = None, file: str | None = None):
         super().__init__(message)
+        # Where the error is, when it is known
+        self.lineno = lineno
+        self.file = file
 
 
 class SimpleCWParser(Parser):
@@ -19,7 +22,8 @@ class SimpleCWParser(Parser):
                 (
                     "Token parse error: token=%s type=%s line=%s index=%s"
                     % (p.value, p.type, p.lineno, p.index)
-                )
+                ),
+                p.lineno,
             )
         if not p:
             raise ParseError("Syntax error at EOF")
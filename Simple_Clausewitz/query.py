@@ -0,0 +1,211 @@
+import re
+from typing import Any, Iterator
+
+from Simple_Clausewitz.compact import CompactTree
+from Simple_Clausewitz.lazy import LazyCWFile
+
+# A step of a path, a key or '*' with an optional [n] to only take the
+# n-th entry that matches
+_STEP_RE = re.compile(r"(?P<key>[^\[\]/]+)(?:\[(?P<nth>-?\d+)\])?")
+
+
+def _is_block(value: Any) -> bool:
+    return isinstance(value, (list, CompactTree, LazyCWFile))
+
+
+def _parse_path(path: str) -> list[tuple[str, int | None]]:
+    steps: list[tuple[str, int | None]] = []
+    for step in path.split("/"):
+        m = _STEP_RE.fullmatch(step)
+        if m is None:
+            raise ValueError("invalid step '%s' in path '%s'" % (step, path))
+        nth = m.group("nth")
+        steps.append((m.group("key"), None if nth is None else int(nth)))
+
+    return steps
+
+
+class QueryIndex:
+    """Index of the keys of a parsed block, built once so looking up a key
+    doesn't have to go over every entry.
+
+    It works over what the parsers return, a CompactTree or a LazyCWFile,
+    keys can show up more than once and all their entries are kept in
+    order. The blocks inside are indexed in turn the first time a lookup
+    or a query goes through them. Values are given as the tree holds them,
+    so the blocks of a LazyCWFile are LazyCWFile and stay unparsed.
+
+    Paths are keys separated by '/', where '*' is any key and a key can
+    be followed by [n] to only take the n-th entry with that key, so
+    '*/potential[0]/has_idea_group' is every has_idea_group in the first
+    potential of every top-level entry.
+    """
+
+    def __init__(self, tree: list[Any] | CompactTree | LazyCWFile):
+        """Index the entries of a block
+
+        Args:
+            tree (list[Any] | CompactTree | LazyCWFile): the block, values of arrays are skipped
+        """
+        self.tree = tree
+        # The key of every entry, and where the ones of each key are
+        self._keys: list[Any] = []
+        self._index: dict[Any, list[int]] = dict()
+        # Values of the entries, the ones of a LazyCWFile are only taken
+        # out of it once they are asked for
+        self._values: list[Any] = []
+        # Indexes of the blocks that were already gone through
+        self._children: dict[int, QueryIndex] = dict()
+
+        if isinstance(tree, LazyCWFile):
+            for key in tree.keys():
+                self._index.setdefault(key, []).append(len(self._keys))
+                self._keys.append(key)
+            return
+
+        for entry in tree:
+            if not isinstance(entry, tuple):
+                continue
+            self._index.setdefault(entry[0], []).append(len(self._keys))
+            self._keys.append(entry[0])
+            self._values.append(entry[1])
+
+    def _value(self, i: int) -> Any:
+        if isinstance(self.tree, LazyCWFile):
+            # Blocks come back as LazyCWFile, so they are not parsed
+            return self.tree._block(i)
+        return self._values[i]
+
+    def _positions(self, key: Any) -> list[int]:
+        positions = self._index.get(key, [])
+        # INTEGER keys, like province ids, can be looked up by string
+        if isinstance(key, str) and key.lstrip("-").isdigit():
+            positions = sorted(positions + self._index.get(int(key), []))
+        return positions
+
+    def _child(self, i: int) -> "QueryIndex":
+        if i not in self._children:
+            self._children[i] = QueryIndex(self._value(i))
+        return self._children[i]
+
+    def keys(self) -> list[Any]:
+        """Keys of all the entries, in order and with duplicates
+
+        Returns:
+            list[Any]: the keys
+        """
+        return list(self._keys)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Value of the first entry with the given key
+
+        Args:
+            key (Any): key of the entry
+            default (Any, optional): what to return if there is no entry with the key. Defaults to None.
+
+        Returns:
+            Any: the value of the entry
+        """
+        positions = self._positions(key)
+        if not positions:
+            return default
+        return self._value(positions[0])
+
+    def get_all(self, key: Any) -> list[Any]:
+        """Values of all the entries with the given key
+
+        Args:
+            key (Any): key of the entries
+
+        Returns:
+            list[Any]: the values of the entries, in order
+        """
+        return [self._value(i) for i in self._positions(key)]
+
+    def children(self) -> Iterator[tuple[Any, Any]]:
+        """Go over all entries, indexing the ones that are blocks
+
+        Yields:
+            Iterator[tuple[Any, Any]]: (key, value) tuples where the value is
+            a QueryIndex if the entry is a block, or the value itself otherwise
+        """
+        for i, key in enumerate(self._keys):
+            value = self._value(i)
+            yield key, self._child(i) if _is_block(value) else value
+
+    def query(self, path: str, with_keys: bool = False) -> Iterator[Any]:
+        """Find the values at the end of a path
+
+        Args:
+            path (str): keys separated by '/', like '*/potential/has_idea_group'
+            with_keys (bool, optional): yield the keys that were matched along with every value. Defaults to False.
+
+        Raises:
+            ValueError: if the path is not valid
+
+        Returns:
+            Iterator[Any]: generator of the values in the order they show up in
+            the tree, or of (keys, value) tuples with a key for every step of the path
+        """
+        # Parsed right away, so a bad path raises here and not once the
+        # results are used
+        steps = _parse_path(path)
+        return self._query(steps, 0, (), with_keys)
+
+    def _query(
+        self,
+        steps: list[tuple[str, int | None]],
+        depth: int,
+        keys: tuple[Any, ...],
+        with_keys: bool,
+    ) -> Iterator[Any]:
+        key, nth = steps[depth]
+        positions = range(len(self._keys)) if key == "*" else self._positions(key)
+        if nth is not None:
+            in_range = -len(positions) <= nth < len(positions)
+            positions = [positions[nth]] if in_range else []
+
+        last = depth == len(steps) - 1
+        for i in positions:
+            key, value = self._keys[i], self._value(i)
+            if last:
+                yield ((*keys, key), value) if with_keys else value
+            elif _is_block(value):
+                yield from self._child(i)._query(
+                    steps, depth + 1, (*keys, key), with_keys
+                )
+
+    def __getitem__(self, key: Any) -> Any:
+        positions = self._positions(key)
+        if not positions:
+            raise KeyError(key)
+        return self._value(positions[0])
+
+    def __contains__(self, key: Any) -> bool:
+        return bool(self._positions(key))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> Iterator[tuple[Any, Any]]:
+        for i, key in enumerate(self._keys):
+            yield key, self._value(i)
+
+
+def query(
+    tree: list[Any] | CompactTree | LazyCWFile, path: str, with_keys: bool = False
+) -> Iterator[Any]:
+    """Find the values at the end of a path, see QueryIndex
+
+    Args:
+        tree (list[Any] | CompactTree | LazyCWFile): the parsed file
+        path (str): keys separated by '/', like '*/potential/has_idea_group'
+        with_keys (bool, optional): yield the keys that were matched along with every value. Defaults to False.
+
+    Raises:
+        ValueError: if the path is not valid
+
+    Returns:
+        Iterator[Any]: generator of the values in the order they show up in the tree
+    """
+    return QueryIndex(tree).query(path, with_keys)
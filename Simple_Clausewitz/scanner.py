@@ -0,0 +1,271 @@
+import re
+import sys
+from typing import Iterator
+
+from sly.lex import Token
+
+from Simple_Clausewitz.parser import ParseError
+
+# The master pattern, whitespace is skipped in front of every match and
+# the alternatives are ordered by how often they show up in game files.
+# Carriage returns are whitespace, game files have CRLF line endings
+#
+# That is only safe because the alternatives start with different
+# characters, except for BOOL and STRING, where BOOL still goes first
+# like it does in SimpleCWLexer. DATE, FLOAT and INTEGER are merged
+# into NUMBER, which always takes the longest of the three, just like
+# trying them in that order does, and are told apart by the dots.
+#
+# Anything that doesn't match a rule is caught by ERROR, one character
+# at a time, so finditer() walks the text without gaps.
+_MASTER_RE = re.compile(
+    r"""
+    [ \t\r]*(?:
+    (?P<BOOL>\b(?:yes|no)\b)
+    |(?P<STRING>[A-Za-z][A-Za-z_0-9.%-:]*|"[^"]*")
+    |(?P<newline>\n[ \t\r\n]*)
+    |(?P<SPECIFIER>=)
+    |(?P<literal>[{}])
+    |(?P<NUMBER>-?\d+(?:\.\d+(?:\.\d+)?)?)
+    |(?P<comment>\#[^\n]*)
+    |(?P<ERROR>.)
+    |$)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+# Same pattern, to run directly over bytes, mmaps or any other buffer.
+# \b only knows about ASCII there, so non-ASCII bytes after yes and no
+# are counted as letters, like most of them would be once decoded, but
+# not the ones before, or a Byte-Order-Mark would be a letter too
+_BYTES_PATTERN = _MASTER_RE.pattern.replace(
+    r"\b(?:yes|no)\b", r"\b(?:yes|no)(?![\w\x80-\xff])"
+).encode()
+_MASTER_BYTES_RE = {
+    "cp1252": re.compile(_BYTES_PATTERN, re.VERBOSE | re.DOTALL),
+    # Illegal characters are reported whole instead of byte by byte
+    "utf-8": re.compile(
+        _BYTES_PATTERN.replace(
+            b"(?P<ERROR>.)", rb"(?P<ERROR>[\xc0-\xff][\x80-\xbf]*|.)"
+        ),
+        re.VERBOSE | re.DOTALL,
+    ),
+}
+
+_BOM = b"\xef\xbb\xbf"
+
+# Braces are their own token types
+_LITERALS = {b"{": "{", b"}": "}"}
+
+
+def detect_encoding(buffer: bytes) -> tuple[str, int]:
+    """Detect the encoding of a Clausewitz file, files are Windows-1252
+    unless they start with a UTF-8 Byte-Order-Mark
+
+    Args:
+        buffer (bytes): contents of the file, or any buffer like a mmap
+
+    Returns:
+        tuple[str, int]: the encoding and the index where the text starts,
+        which is after the Byte-Order-Mark if there is one
+    """
+    if buffer[:3] == _BOM:
+        return "utf-8", 3
+    return "cp1252", 0
+
+
+def decode_file(buffer: bytes) -> str:
+    """Decode the whole of a Clausewitz file, lexing the text is faster
+    than lexing the buffer when all of it is going to be parsed
+
+    Bytes that are not valid in the encoding are replaced, like they are
+    in the strings FastCWLexer decodes out of a buffer.
+
+    Args:
+        buffer (bytes): contents of the file, or any buffer like a mmap
+
+    Returns:
+        str: the text, without the Byte-Order-Mark
+    """
+    encoding, start = detect_encoding(buffer)
+    with memoryview(buffer) as view:
+        return str(view[start:], encoding, errors="replace")
+
+
+class FastCWLexer:
+    """Drop-in replacement for SimpleCWLexer that runs a single compiled
+    pattern over the text instead of going through sly's token loop.
+
+    It yields the same sly Tokens, with the same types, values, line
+    numbers and indexes, so it can be given to SimpleCWParser as is.
+
+    It can also tokenize bytes, or any buffer like a mmap, without decoding
+    them first, only the STRING tokens are decoded and the indexes of the
+    tokens are then byte offsets. That is for when only parts of a file
+    are parsed, like LazyCWFile does, a whole file is lexed faster once
+    it is decoded with decode_file().
+
+    Illegal characters are skipped and printed to stderr, like
+    SimpleCWLexer does, or added to a list of errors when one is given.
+    """
+
+    tokens = {"STRING", "INTEGER", "FLOAT", "BOOL", "DATE", "SPECIFIER"}
+
+    def __init__(self, errors: list[ParseError] | None = None):
+        """Create the lexer
+
+        Args:
+            errors (list[ParseError] | None, optional): add a ParseError for every illegal character to this list instead of printing it. Defaults to None.
+        """
+        self.text = ""
+        self.index = 0
+        self.lineno = 1
+        self.errors = errors
+
+    def _illegal(self, value: str, lineno: int):
+        message = "Illegal Character '%s'" % value
+        if self.errors is None:
+            # Not to stdout, where the output of the tools goes
+            print(message, file=sys.stderr)
+        else:
+            self.errors.append(ParseError(message, lineno))
+
+    def tokenize(
+        self,
+        text: str | bytes,
+        lineno: int = 1,
+        index: int = 0,
+        end: int | None = None,
+        encoding: str | None = None,
+    ) -> Iterator[Token]:
+        """Tokenize the given text
+
+        Args:
+            text (str | bytes): Clausewitz script to tokenize, or a buffer with it.
+            lineno (int, optional): line number of the start of the text. Defaults to 1.
+            index (int, optional): index to start tokenizing from. Defaults to 0.
+            end (int | None, optional): index to stop tokenizing at. Defaults to the end of the text.
+            encoding (str | None, optional): encoding of a buffer, detected with detect_encoding() if not given.
+
+        Yields:
+            Iterator[Token]: the tokens found in the text
+        """
+        if end is None:
+            end = len(text)
+
+        if not isinstance(text, str):
+            if encoding is None:
+                encoding, start = detect_encoding(text)
+                index = max(index, start)
+            yield from self._tokenize_buffer(text, lineno, index, end, encoding)
+            return
+
+        self.text = text
+        try:
+            for m in _MASTER_RE.finditer(text, index, end):
+                kind = m.lastgroup
+                if kind == "newline":
+                    lineno += m.group(kind).count("\n")
+                    continue
+                if kind == "comment" or kind is None:
+                    continue
+
+                value = m.group(kind)
+                stop = m.end()
+                start = stop - len(value)
+                if kind == "STRING":
+                    # Strip double-quotes from a quoted string with no
+                    # spaces
+                    if '"' in value and " " not in value:
+                        value = value.strip('"')
+                elif kind == "literal":
+                    kind = value
+                elif kind == "NUMBER":
+                    dots = value.count(".")
+                    if dots == 0:
+                        kind = "INTEGER"
+                        value = int(value)
+                    elif dots == 1:
+                        kind = "FLOAT"
+                        value = float(value)
+                    else:
+                        kind = "DATE"
+                elif kind == "BOOL":
+                    # Same as SimpleCWLexer, this makes both yes and no True
+                    value = bool(value)
+                elif kind == "ERROR":
+                    self._illegal(value, lineno)
+                    continue
+
+                tok = Token()
+                tok.type = kind
+                tok.value = value
+                tok.lineno = lineno
+                tok.index = start
+                tok.end = stop
+                yield tok
+        finally:
+            self.index = end
+            self.lineno = lineno
+
+    def _tokenize_buffer(
+        self, buffer: bytes, lineno: int, index: int, end: int, encoding: str
+    ) -> Iterator[Token]:
+        # Same as tokenize(), but only decoding STRING tokens
+        self.text = buffer
+        # Keys and values repeat a lot, each one is only decoded once
+        strings: dict[bytes, str] = dict()
+        try:
+            master = _MASTER_BYTES_RE.get(encoding, _MASTER_BYTES_RE["cp1252"])
+            for m in master.finditer(buffer, index, end):
+                kind = m.lastgroup
+                if kind == "newline":
+                    lineno += m.group(kind).count(b"\n")
+                    continue
+                if kind == "comment" or kind is None:
+                    continue
+
+                value = m.group(kind)
+                stop = m.end()
+                start = stop - len(value)
+                if kind == "STRING":
+                    raw = value
+                    value = strings.get(raw)
+                    if value is None:
+                        value = raw.decode(encoding, errors="replace")
+                        # Strip double-quotes from a quoted string with no
+                        # spaces
+                        if '"' in value and " " not in value:
+                            value = value.strip('"')
+                        strings[raw] = value
+                elif kind == "SPECIFIER":
+                    value = "="
+                elif kind == "literal":
+                    kind = value = _LITERALS[value]
+                elif kind == "NUMBER":
+                    dots = value.count(b".")
+                    if dots == 0:
+                        kind = "INTEGER"
+                        value = int(value)
+                    elif dots == 1:
+                        kind = "FLOAT"
+                        value = float(value)
+                    else:
+                        kind = "DATE"
+                        value = value.decode()
+                elif kind == "BOOL":
+                    # Same as SimpleCWLexer, this makes both yes and no True
+                    value = bool(value)
+                elif kind == "ERROR":
+                    self._illegal(value.decode(encoding, errors="replace"), lineno)
+                    continue
+
+                tok = Token()
+                tok.type = kind
+                tok.value = value
+                tok.lineno = lineno
+                tok.index = start
+                tok.end = stop
+                yield tok
+        finally:
+            self.index = end
+            self.lineno = lineno
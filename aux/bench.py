@@ -0,0 +1,604 @@
+#!/usr/bin/env python3
+#
+# Benchmark the lexers, parsers and localisation loaders over a synthetic
+# corpus, or over real files, and compare the results with a baseline
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Iterator
+
+from Paradox_Localisation import (
+    LocalisationLexer,
+    LocalisationParser,
+    generate_localisation,
+    read_localisation_file,
+)
+from Simple_Clausewitz import (
+    CompactTree,
+    FastCWLexer,
+    FastCWParser,
+    LazyCWFile,
+    SimpleCWLexer,
+    SimpleCWParser,
+    decode_file,
+    detect_encoding,
+    iter_events,
+)
+
+# Bump whenever the corpus or what is measured changes, results with
+# another version can't be compared
+BENCH_VERSION = 2
+
+# Modules whose import time is measured
+MODULES = ("Simple_Clausewitz", "Paradox_Localisation", "hw_utils")
+
+TAGS = ["FRA", "ENG", "BUR", "CAS", "POR", "HAB", "BOH", "POL", "LIT", "MOS", "TUR"]
+CATEGORIES = ["ADM", "DIP", "MIL"]
+MODIFIERS = [
+    "discipline",
+    "land_morale",
+    "naval_forcelimit_modifier",
+    "global_tax_modifier",
+    "production_efficiency",
+    "diplomatic_reputation",
+    "legitimacy",
+    "army_tradition_decay",
+]
+TRIGGERS = [
+    "has_country_flag",
+    "has_idea_group",
+    "is_at_war",
+    "religion",
+    "culture_group",
+    "has_reform",
+]
+WORDS = (
+    "the of realm crown army trade navy faith court reform glory empire "
+    "people throne border march league council union war peace coin"
+).split()
+
+
+class Corpus:
+    """Deterministic generator of mod files, the same seed always gives
+    the same files"""
+
+    def __init__(
+        self, seed: int = 0, depth: int = 6, crlf: bool = False, bom: bool = False
+    ):
+        self.random = random.Random(seed)
+        self.depth = depth
+        self.newline = "\r\n" if crlf else "\n"
+        self.bom = bom
+        self.count = 0
+
+    def name(self, prefix: str) -> str:
+        self.count += 1
+        return "%s_%d" % (prefix, self.count)
+
+    def sentence(self, words: int) -> str:
+        return " ".join(self.random.choice(WORDS) for _ in range(words))
+
+    def scalar(self) -> str:
+        r = self.random
+        kind = r.randrange(6)
+        if kind == 0:
+            return str(r.randint(-100, 1000))
+        if kind == 1:
+            return "%.3f" % r.uniform(-1, 1)
+        if kind == 2:
+            return r.choice(["yes", "no"])
+        if kind == 3:
+            return "%d.%d.%d" % (
+                r.randint(1444, 1821),
+                r.randint(1, 12),
+                r.randint(1, 28),
+            )
+        if kind == 4:
+            return '"%s"' % self.sentence(r.randint(1, 12))
+        return r.choice(TAGS)
+
+    def trigger(self, indent: int, depth: int) -> Iterator[str]:
+        # Nested AND/OR/NOT blocks down to the given depth
+        r = self.random
+        pad = "\t" * indent
+        for _ in range(r.randint(1, 3)):
+            if depth > 0 and r.random() < 0.5:
+                yield "%s%s = {" % (pad, r.choice(["AND", "OR", "NOT"]))
+                yield from self.trigger(indent + 1, depth - 1)
+                yield "%s}" % pad
+            else:
+                yield "%s%s = %s" % (pad, r.choice(TRIGGERS), self.scalar())
+
+    def idea_group(self) -> Iterator[str]:
+        r = self.random
+        yield "%s = {" % self.name("ideas")
+        yield "\tcategory = %s" % r.choice(CATEGORIES)
+        yield "\tstart = {"
+        yield "\t\t%s = %s" % (r.choice(MODIFIERS), "%.2f" % r.uniform(-1, 1))
+        yield "\t}"
+        yield "\ttrigger = {"
+        yield from self.trigger(2, self.depth)
+        yield "\t}"
+        yield "\tfree = yes # generated"
+        for i in range(7):
+            yield "\tidea_%d = {" % i
+            yield "\t\t%s = %s" % (r.choice(MODIFIERS), "%.2f" % r.uniform(-1, 1))
+            yield "\t}"
+        yield "}"
+
+    def policy(self) -> Iterator[str]:
+        r = self.random
+        yield "%s = {" % self.name("policy")
+        yield "\tmonarch_power = %s" % r.choice(CATEGORIES)
+        yield "\tpotential = {"
+        yield "\t\thas_idea_group = ideas_%d" % r.randint(1, max(1, self.count))
+        yield "\t\thas_idea_group = ideas_%d" % r.randint(1, max(1, self.count))
+        yield "\t}"
+        yield "\tallow = {"
+        yield from self.trigger(2, self.depth)
+        yield "\t}"
+        yield "\t%s = %s" % (r.choice(MODIFIERS), "%.2f" % r.uniform(-1, 1))
+        yield "\tai_will_do = { factor = 1 }"
+        yield "}"
+
+    def mission_group(self) -> Iterator[str]:
+        r = self.random
+        yield "%s = {" % self.name("missions")
+        yield "\tslot = %d" % r.randint(1, 5)
+        yield "\tgeneric = no"
+        yield "\tai = yes"
+        yield "\tpotential = {"
+        yield "\t\ttag = %s" % r.choice(TAGS)
+        yield from self.trigger(2, self.depth)
+        yield "\t}"
+        yield "\thas_country_shield = yes"
+        for i in range(r.randint(2, 6)):
+            yield "\t%s = {" % self.name("mission")
+            yield "\t\ticon = mission_%s" % r.choice(WORDS)
+            yield "\t\tposition = %d" % (i + 1)
+            yield "\t\trequired_missions = { }"
+            yield "\t\tprovinces_to_highlight = { %s }" % " ".join(
+                str(r.randint(1, 4000)) for _ in range(r.randint(1, 8))
+            )
+            yield "\t\ttrigger = {"
+            yield from self.trigger(3, self.depth)
+            yield "\t\t}"
+            yield "\t\teffect = {"
+            yield "\t\t\tadd_prestige = %d" % r.randint(5, 25)
+            yield "\t\t\tcountry_event = { id = flavor.%d days = 30 }" % r.randint(
+                1, 999
+            )
+            yield "\t\t}"
+            yield "\t}"
+        yield "}"
+
+    def localisation(self) -> Iterator[str]:
+        r = self.random
+        # Keys reference each other now and then
+        key = self.name("loc")
+        text = self.sentence(r.randint(2, 60))
+        if r.random() < 0.1 and self.count > 1:
+            text += " $loc_%d$" % r.randint(1, self.count - 1)
+        yield ' %s:%d "%s"' % (key, r.randint(0, 2), text.capitalize())
+
+    def write(
+        self, path: str, entry: Callable[[], Iterator[str]], size: int, header: str = ""
+    ) -> int:
+        """Write entries to a file until it is at least size bytes
+
+        Args:
+            path (str): the file
+            entry (Callable[[], Iterator[str]]): gives the lines of an entry every time it is called
+            size (int): how many bytes to write at least
+            header (str, optional): first line of the file. Defaults to "".
+
+        Returns:
+            int: how many bytes were written
+        """
+        written = 0
+        with open(path, "w", encoding="utf-8", newline="") as fd:
+            if self.bom:
+                fd.write("\ufeff")
+            if header:
+                fd.write(header + self.newline)
+            while written < size:
+                chunk = self.newline.join(entry()) + self.newline
+                fd.write(chunk)
+                written += len(chunk)
+
+        return os.path.getsize(path)
+
+
+def generate(
+    directory: str,
+    size: int,
+    file_size: int,
+    seed: int,
+    depth: int,
+    crlf: bool,
+    bom: bool,
+) -> dict[str, Any]:
+    """Generate a mod with ideas, policies, missions and localisation
+
+    Args:
+        directory (str): where to write the mod
+        size (int): about how many bytes to write in total
+        file_size (int): about how many bytes to write in each file
+        seed (int): seed of the generator
+        depth (int): how deep triggers are nested
+        crlf (bool): end lines with CRLF
+        bom (bool): start files with a UTF-8 BOM
+
+    Returns:
+        dict[str, Any]: what the corpus is, to be saved along with the results
+    """
+    corpus = Corpus(seed, depth, crlf, bom)
+    # The share of the corpus of every kind of file
+    kinds = [
+        ("common/ideas", "ideas", corpus.idea_group, "", 0.2),
+        ("common/policies", "policies", corpus.policy, "", 0.1),
+        ("missions", "missions", corpus.mission_group, "", 0.4),
+        ("localisation", "bench_l_english.yml", corpus.localisation, "l_english:", 0.3),
+    ]
+
+    total = 0
+    files = 0
+    for folder, name, entry, header, share in kinds:
+        os.makedirs(os.path.join(directory, folder), exist_ok=True)
+        budget = int(size * share)
+        i = 0
+        while budget > 0:
+            if name.endswith(".yml"):
+                path = os.path.join(directory, folder, "%d_%s" % (i, name))
+            else:
+                path = os.path.join(directory, folder, "%d_%s.txt" % (i, name))
+            written = corpus.write(path, entry, min(file_size, budget), header)
+            budget -= written
+            total += written
+            files += 1
+            i += 1
+
+    return {
+        "seed": seed,
+        "size": size,
+        "file_size": file_size,
+        "depth": depth,
+        "crlf": crlf,
+        "bom": bom,
+        "bytes": total,
+        "files": files,
+    }
+
+
+def files_of(directory: str, folders: list[str]) -> list[str]:
+    paths = []
+    for folder in folders:
+        path = os.path.join(directory, folder)
+        if not os.path.isdir(path):
+            continue
+        paths.extend(os.path.join(path, name) for name in sorted(os.listdir(path)))
+    return paths
+
+
+def decode(data: bytes) -> str:
+    encoding, start = detect_encoding(data)
+    return data[start:].decode(encoding)
+
+
+# Every benchmark takes the bytes and path of a file, or the corpus
+# directory for the ones that go over all of it
+SCRIPT_BENCHMARKS: dict[str, Callable[[bytes, str], Any]] = {
+    "lex-sly": lambda data, path: sum(
+        1 for _ in SimpleCWLexer().tokenize(decode(data))
+    ),
+    # The way the tools lex whole files
+    "lex-fast": lambda data, path: sum(
+        1 for _ in FastCWLexer().tokenize(decode_file(data))
+    ),
+    # The way LazyCWFile lexes parts of them
+    "lex-fast-bytes": lambda data, path: sum(1 for _ in FastCWLexer().tokenize(data)),
+    "parse-sly": lambda data, path: SimpleCWParser().parse(
+        SimpleCWLexer().tokenize(decode(data))
+    ),
+    "parse-fast": lambda data, path: FastCWParser().parse(
+        FastCWLexer().tokenize(decode_file(data))
+    ),
+    "compact": lambda data, path: CompactTree.from_events(
+        iter_events(FastCWLexer().tokenize(decode_file(data)))
+    ),
+    "lazy": lambda data, path: LazyCWFile(data).keys(),
+}
+LOCALISATION_BENCHMARKS: dict[str, Callable[[bytes, str], Any]] = {
+    "localisation-parser": lambda data, path: LocalisationParser().parse(
+        LocalisationLexer().tokenize(data.decode("utf-8-sig"))
+    ),
+    "localisation-read": lambda data, path: list(read_localisation_file(path)),
+}
+CORPUS_BENCHMARKS: dict[str, Callable[[str], Any]] = {
+    "generate-localisation": lambda directory: generate_localisation([directory]),
+}
+
+
+def measure(run: Callable[[], Any], repeat: int) -> tuple[float, int]:
+    """Time a benchmark and trace its memory
+
+    Returns:
+        tuple[float, int]: the best time out of repeat runs, in seconds, and
+        the peak of memory allocated during a traced run, in bytes
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    # Traced apart, tracing slows everything down
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return best or 0.0, peak
+
+
+def import_time(module: str, repeat: int) -> float:
+    """Best time to import a module in a new interpreter, in seconds"""
+    code = (
+        "import time; t = time.perf_counter(); import %s; print(time.perf_counter() - t)"
+        % module
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            env=env,
+            check=True,
+        ).stdout
+        elapsed = float(out.split()[-1])
+        if best is None or elapsed < best:
+            best = elapsed
+    return best or 0.0
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Find what got slower, or uses more memory, than in the baseline
+
+    Returns:
+        list[str]: a line for every regression
+    """
+    regressions = []
+    if baseline.get("version") != results["version"]:
+        return [
+            "baseline is from version %s of the benchmarks" % baseline.get("version")
+        ]
+
+    for name, result in results["components"].items():
+        base = baseline["components"].get(name)
+        if base is None:
+            continue
+        if result["mb_per_s"] < base["mb_per_s"] * (1 - tolerance):
+            regressions.append(
+                "%s: %.2f MB/s, was %.2f MB/s"
+                % (name, result["mb_per_s"], base["mb_per_s"])
+            )
+        if result["peak_bytes"] > base["peak_bytes"] * (1 + tolerance):
+            regressions.append(
+                "%s: peak of %d bytes, was %d bytes"
+                % (name, result["peak_bytes"], base["peak_bytes"])
+            )
+
+    for module, seconds in results["imports"].items():
+        base = baseline["imports"].get(module)
+        if base is not None and seconds > base * (1 + tolerance):
+            regressions.append("import %s: %.3fs, was %.3fs" % (module, seconds, base))
+
+    return regressions
+
+
+def parse_size(text: str) -> int:
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3}
+    text = text.upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def parse_args(args=None):
+    d = "Benchmark the lexers, parsers and localisation loaders"
+    parser = argparse.ArgumentParser(description=d)
+    parser.add_argument(
+        "-d",
+        "--corpus",
+        type=str,
+        default=None,
+        help="mod directory to benchmark, a synthetic one is generated if none is given",
+    )
+    parser.add_argument(
+        "-g",
+        "--generate",
+        type=str,
+        default=None,
+        help="only generate the synthetic corpus in this directory",
+    )
+    parser.add_argument(
+        "-s",
+        "--size",
+        type=parse_size,
+        default=parse_size("2M"),
+        help="size of the synthetic corpus, like 512K, 10M or 1G",
+    )
+    parser.add_argument(
+        "--file-size",
+        type=parse_size,
+        default=parse_size("256K"),
+        help="size of every file of the synthetic corpus",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the synthetic corpus"
+    )
+    parser.add_argument(
+        "--depth", type=int, default=6, help="how deep triggers are nested"
+    )
+    parser.add_argument(
+        "--crlf", action="store_true", default=False, help="end lines with CRLF"
+    )
+    parser.add_argument(
+        "--bom", action="store_true", default=False, help="start files with a UTF-8 BOM"
+    )
+    parser.add_argument(
+        "-n",
+        "--repeat",
+        type=int,
+        default=3,
+        help="how many times to run every benchmark, the best time is kept",
+    )
+    parser.add_argument(
+        "-b",
+        "--bench",
+        action="append",
+        default=None,
+        help="only run this benchmark, can be given more than once",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        type=argparse.FileType("w"),
+        default=None,
+        help="write the results as JSON to this file",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=argparse.FileType("r"),
+        default=None,
+        help="results to compare with, exits with 1 if anything regressed",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="how much slower or bigger than the baseline is still fine, 0.1 is 10%%",
+    )
+    return parser.parse_args(args)
+
+
+def main(args=None) -> int:
+    args = parse_args(args)
+
+    options = (args.size, args.file_size, args.seed, args.depth, args.crlf, args.bom)
+    if args.generate is not None:
+        corpus = generate(args.generate, *options)
+        print("%d files, %d bytes" % (corpus["files"], corpus["bytes"]))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus is not None:
+            directory = args.corpus
+            corpus = {"directory": os.path.abspath(directory)}
+        else:
+            directory = tmp
+            corpus = generate(directory, *options)
+
+        scripts = files_of(directory, ["common/ideas", "common/policies", "missions"])
+        localisation = files_of(directory, ["localisation"])
+
+        results: dict[str, Any] = {
+            "version": BENCH_VERSION,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": corpus,
+            "components": {},
+            "imports": {},
+        }
+
+        def wanted(name: str) -> bool:
+            return args.bench is None or name in args.bench
+
+        def over(
+            paths: list[str], benchmark: Callable[[bytes, str], Any]
+        ) -> Callable[[], Any]:
+            def run():
+                for path in paths:
+                    with open(path, "rb") as fd:
+                        data = fd.read()
+                    benchmark(data, path)
+
+            return run
+
+        groups = [(SCRIPT_BENCHMARKS, scripts), (LOCALISATION_BENCHMARKS, localisation)]
+        for benchmarks, paths in groups:
+            size = sum(os.path.getsize(path) for path in paths)
+            for name, benchmark in benchmarks.items():
+                if not wanted(name) or not paths:
+                    continue
+                seconds, peak = measure(over(paths, benchmark), args.repeat)
+                results["components"][name] = {
+                    "bytes": size,
+                    "seconds": seconds,
+                    "mb_per_s": size / (1024 * 1024) / seconds if seconds else 0.0,
+                    "peak_bytes": peak,
+                }
+
+        size = sum(os.path.getsize(path) for path in localisation)
+        for name, benchmark in CORPUS_BENCHMARKS.items():
+            if not wanted(name) or not localisation:
+                continue
+            seconds, peak = measure(lambda: benchmark(directory), args.repeat)
+            results["components"][name] = {
+                "bytes": size,
+                "seconds": seconds,
+                "mb_per_s": size / (1024 * 1024) / seconds if seconds else 0.0,
+                "peak_bytes": peak,
+            }
+
+    if wanted("imports"):
+        for module in MODULES:
+            results["imports"][module] = import_time(module, args.repeat)
+
+    for name, result in results["components"].items():
+        print(
+            "%-22s %8.3fs %9.2f MB/s %10.1f MiB peak"
+            % (
+                name,
+                result["seconds"],
+                result["mb_per_s"],
+                result["peak_bytes"] / (1024 * 1024),
+            )
+        )
+    for module, seconds in results["imports"].items():
+        print("import %-15s %8.3fs" % (module, seconds))
+
+    if args.out is not None:
+        json.dump(results, args.out, indent=2)
+        args.out.write("\n")
+
+    if args.baseline is not None:
+        regressions = compare(results, json.load(args.baseline), args.tolerance)
+        for regression in regressions:
+            print("regression: %s" % regression, file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#
+# Report which localisation keys every language is missing, or has
+# outdated, compared to a reference language
+
+import argparse
+import sys
+
+from hw_utils import write_markdown_table
+from Paradox_Localisation import generate_localisations, localisation_coverage
+
+LANGUAGES = ["english", "french", "german", "spanish"]
+
+
+def parse_args(args=None):
+    d = "Report the missing and outdated localisation keys of every language"
+    parser = argparse.ArgumentParser(description=d)
+    parser.add_argument(
+        "dirs",
+        nargs="+",
+        help="directories to read the localisation of, like the mod and the game",
+    )
+    parser.add_argument(
+        "-l",
+        "--lang",
+        action="append",
+        help="language to check, can be given more than once. Defaults to %s"
+        % ", ".join(LANGUAGES),
+    )
+    parser.add_argument(
+        "-r",
+        "--reference",
+        default="english",
+        help="language the others are translated from",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="how many processes to read the files with",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="list the missing and outdated keys after the table",
+    )
+    return parser.parse_args(args)
+
+
+def main(args=None) -> int:
+    args = parse_args(args)
+
+    languages = args.lang if args.lang is not None else list(LANGUAGES)
+    if args.reference not in languages:
+        languages.insert(0, args.reference)
+
+    # All the languages are read in a single go over the directories
+    localisations = generate_localisations(args.dirs, languages, workers=args.jobs)
+    report = localisation_coverage(localisations, args.reference)
+
+    rows = [[args.reference, str(len(localisations[args.reference])), "", ""]]
+    for language, coverage in report.items():
+        rows.append(
+            [
+                language,
+                str(len(localisations[language])),
+                str(len(coverage["missing"])),
+                str(len(coverage["outdated"])),
+            ]
+        )
+    write_markdown_table(sys.stdout, ["Language", "Keys", "Missing", "Outdated"], rows)
+
+    if args.verbose:
+        for language, coverage in report.items():
+            for kind in ("missing", "outdated"):
+                for key in sorted(coverage[kind]):
+                    print("%s %s %s" % (language, kind, key))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,42 +11,7 @@ import sys
 import jinja2
 import markdown
 
-TEMPLATE = """<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        table {
-            border: solid 1px #DDEEEE;
-            border-collapse: collapse;
-            border-spacing: 0;
-            font: normal 13px Arial, sans-serif;
-            margin-left: auto;
-            margin-right: auto;
-        }
-        table thead th {
-            background-color: #DDEFEF;
-            border: solid 1px #DDEEEE;
-            color: #336B6B;
-            padding: 10px;
-            text-align: left;
-            text-shadow: 1px 1px 1px #fff;
-        }
-        {{first_child}}
-        table tbody td {
-            border: solid 1px #DDEEEE;
-            color: #333;
-            padding: 10px;
-            text-shadow: 1px 1px 1px #fff;
-        }
-    </style>
-</head>
-<body>
-<div class="container">
-{{content}}
-</div>
-</body>
-</html>
-"""
+from hw_utils.html_table import FIRST_CHILD_STYLE, TEMPLATE
 
 
 def parse_args(args=None):
@@ -81,17 +46,7 @@ def main(args=None):
     extensions = ["extra", "smarty"]
     html = markdown.markdown(md, extensions=extensions, output_format="html5")
     if args.highlight_first_row:
-        first_child = """
-        table tbody tr td:first-child {
-            background-color: #DDEFEF;
-            border: solid 1px #DDEEEE;
-            color: #336B6B;
-            padding: 10px;
-            text-align: left;
-            text-shadow: 1px 1px 1px #fff;
-            font-weight: bold
-        }
-        """
+        first_child = FIRST_CHILD_STYLE
     else:
         first_child = ""
     doc = jinja2.Template(TEMPLATE).render(content=html, first_child=first_child)
@@ -2,15 +2,29 @@
 
 import argparse
 import sys
+import time
+from functools import partial
 from os.path import basename
-from typing import Any
+from typing import Any, Iterator
 
+from Paradox_Localisation.resolve import LocalisationResolver
+from Paradox_Localisation.store import LocalisationStore
 from Paradox_Localisation.utils import generate_localisation
-from Simple_Clausewitz import SimpleCWLexer, SimpleCWParser, ParseError
-from hw_utils import make_markdown_table, has_mapping
-
-LEXER = SimpleCWLexer()
-PARSER = SimpleCWParser()
+from Simple_Clausewitz import (
+    LazyCWFile,
+    ParseError,
+    QueryIndex,
+    lazy_file,
+    map_files,
+)
+from hw_utils import (
+    ModFS,
+    ParseCache,
+    TriggerMatcher,
+    write_html_table,
+    metrics,
+    write_markdown_table,
+)
 
 ANTE_BELLUM: bool = False
 
@@ -37,260 +51,215 @@ def add_branching_mission(dic: dict[str, tuple[int, int, int]], tag: str):
         dic[tag] = (1, 0, 1)
 
 
-def search_up(file: str) -> str | None:
-    from os.path import abspath, dirname, isdir
-
-    if isdir(abspath(file) + "/localisation"):
-        return file
-    elif file == "/":
-        return None
-    else:
-        return search_up(dirname(abspath(file)))
-
-
-def walk(
-    tree: tuple, in_not: bool, tags: set[str] | None = None
-) -> tuple[tuple, bool, set[str]]:
-    if tags is None:
-        tags = set()
-
-    for elem in tree:
-        if elem[0] == "tag" and not in_not:
-            tags.add(elem[1])
-        if elem[0].upper() == "NOT":
-            # We are inside a NOT = { } block
-            walk(elem[1], not in_not, tags)
-        if any(x == elem[0].upper() for x in ["AND", "OR"]):
-            # We are inside either a AND = { } or OR = { }
-            walk(elem[1], in_not, tags)
-
-    return (tree, in_not, tags)
-
-
-def count_missions(files: list) -> dict[str, tuple[int, int, int]]:
-    dic: dict[str, tuple[int, int, int]] = dict()
-    for file in files:
-        try:
-            result = PARSER.parse(LEXER.tokenize(file.read()))
-        except ParseError as e:
-            print("%s: failed to parse: %s" % (basename(file.name), e), file=sys.stderr)
-            continue  # Try parsing the other files
-        # Some files might be messed up
-        except Exception as e:
-            print("%s: %s" % (basename(file.name), e), file=sys.stderr)
-            continue
-
-        for mission_group in result:
-            eligible_tags: set[str] = set()
-            potential_statement: tuple[str, Any]
-            for statement in mission_group[1]:
-                # Check the "potential = { }" block to see which tags
-                # are eligible for the missions
-                if statement[0] == "potential":
-                    potential_statement = statement[1]
-                    _, _, eligible_tags = walk(statement[1], False, None)
-
-            for statement in mission_group[1]:
+def search_up(file: str, fs: ModFS | None = None) -> str | None:
+    from os.path import abspath, dirname
+
+    if fs is None:
+        fs = ModFS([])
+
+    # Go up until a directory has a localisation directory, the stat
+    # results are shared by all the files given
+    while not fs.isdir(abspath(file) + "/localisation"):
+        if file == "/":
+            return None
+        file = dirname(abspath(file))
+
+    return file
+
+
+# Ante-Bellum specific branches of the mission trees of some tags, the
+# first one whose mapping is in the potential = { } of a mission group
+# is the branch the missions are counted under
+AB_BRANCHES: list[tuple[str, tuple[str, Any], str]] = [
+    # Golden Horde branches
+    ("GLH", ("has_country_flag", "glh_european_tree"), "European Path"),
+    ("GLH", ("has_country_flag", "glh_horde_tree"), "Horde Path"),
+    ("YUA", ("has_country_flag", "YUA_HORDE"), "Horde Path"),
+    (
+        "YUA",
+        (
+            "NOT",
+            [
+                ("has_country_flag", "YUA_HORDE"),
+                ("has_country_flag", "YUA_NESTORIAN"),
+            ],
+        ),
+        "Sinicized Path",
+    ),
+    ("YUA", ("religion", "nestorian"), "Nestorian Path"),
+    ("RUM", ("religion_group", "christian"), "Christian Path"),
+    ("RUM", ("religion_group", "muslim"), "Muslim Path"),
+    ("RUM", ("religion", "zoroastrian"), "Zoroastrian Path"),
+    ("LIT", ("has_country_flag", "lithuania_pagan_path"), "Pagan Path"),
+    ("LIT", ("has_country_flag", "lithuania_orthodox_path"), "Orthodox Path"),
+    ("LIT", ("has_country_flag", "lithuania_catholic_path"), "Catholic Path"),
+]
+
+# Finds the eligible tags and all the branches in a single go over the
+# potential = { } of a mission group
+POTENTIAL_MATCHER = TriggerMatcher(
+    [mapping for _, mapping, _ in AB_BRANCHES], collect=["tag"]
+)
+
+
+def branch_tags(potential: Any, ante_bellum: bool) -> list[str]:
+    """Find the tags a mission group is for, and their branch if any
+
+    Args:
+        potential (Any): the potential = { } of the mission group
+        ante_bellum (bool): whether to look for Ante-Bellum branches
+
+    Returns:
+        list[str]: the tags, as TAG+Branch Name for the ones with a branch
+    """
+    found, collected = POTENTIAL_MATCHER.match(potential)
+
+    tags: list[str] = []
+    for tag in collected["tag"]:
+        if ante_bellum:
+            for (branch_tag, _, branch), present in zip(AB_BRANCHES, found):
+                if branch_tag == tag and present:
+                    tag = tag + "+" + branch
+                    break
+        tags.append(tag)
+
+    return tags
+
+
+def count_mission_groups(
+    result: LazyCWFile, dic: dict[str, tuple[int, int, int]], ante_bellum: bool
+):
+    for _, mission_group in result.blocks():
+        group = QueryIndex(mission_group)
+        # The tags are only worked out once per group, and not for every
+        # mission in it
+        eligible_tags: list[str] = []
+        for statement in group.get_all("potential"):
+            # Check the "potential = { }" block to see which tags
+            # are eligible for the missions
+            with metrics.phase("triggers"):
+                eligible_tags = branch_tags(statement, ante_bellum)
+
+        # Missions are only indexed, only their icon ends up parsed
+        for key, mission in group.children():
+            if any(
+                x == key.lower()
+                for x in [
+                    "potential",
+                    "generic",
+                    "ai",
+                    "has_country_shield",
+                    "slot",
+                ]
+            ):
+                continue
+
+            if isinstance(mission, QueryIndex) and all(
+                x in mission
+                for x in [
+                    "icon",
+                    "trigger",
+                    "effect",
+                ]
+            ):
+                # AB-specific check if the mission
+                # is branching by use of 2 specific
+                # icons, icon_mission_unknown (from origins DLC)
+                # and icon_locked_mission (from Lions of the North DLC)
                 if any(
-                    x == statement[0].lower()
+                    x in mission["icon"]
                     for x in [
-                        "potential",
-                        "generic",
-                        "ai",
-                        "has_country_shield",
-                        "slot",
+                        "mission_unknown_mission",
+                        "mission_locked_mission",
                     ]
                 ):
-                    continue
+                    for tag in eligible_tags:
+                        add_branching_mission(dic, tag)
+                else:
+                    for tag in eligible_tags:
+                        add_normal_mission(dic, tag)
+
+
+def count_file(
+    file: str, cache: ParseCache | None, ante_bellum: bool
+) -> dict[str, tuple[int, int, int]]:
+    # Entries are only parsed when they are needed, so count them
+    # apart and only keep the count if the whole file parses
+    file_dic: dict[str, tuple[int, int, int]] = dict()
+    start = time.perf_counter()
+    with lazy_file(file, cache) as result:
+        metrics.add_time("index", time.perf_counter() - start)
+        metrics.count("bytes", result.end - result.start)
+        # Parsing the entries that are needed, and looking into them
+        with metrics.phase("missions"):
+            count_mission_groups(result, file_dic, ante_bellum)
+
+    return file_dic
+
+
+def count_missions(
+    files: list[str], cache: ParseCache | None = None, workers: int = 1
+) -> dict[str, tuple[int, int, int]]:
+    dic: dict[str, tuple[int, int, int]] = dict()
+    # What is counted in the processes is sent back with the counts
+    counter = partial(metrics.collect, count_file, cache=cache, ante_bellum=ANTE_BELLUM)
+    for file, result, e in map_files(counter, files, workers):
+        metrics.count("files")
+        if isinstance(e, ParseError):
+            metrics.count("failures")
+            print("%s: failed to parse: %s" % (basename(file), e), file=sys.stderr)
+            continue  # Try parsing the other files
+        # Some files might be messed up
+        elif e is not None:
+            metrics.count("failures")
+            print("%s: %s" % (basename(file), e), file=sys.stderr)
+            continue
 
-                if all(
-                    x in dict(statement[1])
-                    for x in [
-                        "icon",
-                        "trigger",
-                        "effect",
-                    ]
-                ):
-                    # AB-specific check if the mission
-                    # is branching by use of 2 specific
-                    # icons, icon_mission_unknown (from origins DLC)
-                    # and icon_locked_mission (from Lions of the North DLC)
-                    if any(
-                        x in dict(statement[1])["icon"]
-                        for x in [
-                            "mission_unknown_mission",
-                            "mission_locked_mission",
-                        ]
-                    ):
-                        for tag in eligible_tags:
-                            if ANTE_BELLUM:
-                                # Check for Golden Horde branches
-                                if tag == "GLH" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "glh_european_tree"),
-                                ):
-                                    add_branching_mission(dic, (tag + "+European Path"))
-                                    continue
-                                if tag == "GLH" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "glh_horde_tree"),
-                                ):
-                                    add_branching_mission(dic, (tag + "+Horde Path"))
-                                    continue
-                                if tag == "YUA" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "YUA_HORDE"),
-                                ):
-                                    add_branching_mission(dic, (tag + "+Horde Path"))
-                                    continue
-                                if tag == "YUA" and has_mapping(
-                                    potential_statement,
-                                    (
-                                        "NOT",
-                                        [
-                                            ("has_country_flag", "YUA_HORDE"),
-                                            ("has_country_flag", "YUA_NESTORIAN"),
-                                        ],
-                                    ),
-                                ):
-                                    add_branching_mission(
-                                        dic, (tag + "+Sinicized Path")
-                                    )
-                                    continue
-                                if tag == "YUA" and has_mapping(
-                                    potential_statement,
-                                    ("religion", "nestorian"),
-                                ):
-                                    add_branching_mission(
-                                        dic, (tag + "+Nestorian Path")
-                                    )
-                                    continue
-                                if tag == "RUM" and has_mapping(
-                                    potential_statement,
-                                    ("religion_group", "christian"),
-                                ):
-                                    add_branching_mission(
-                                        dic, (tag + "+Christian Path")
-                                    )
-                                    continue
-                                if tag == "RUM" and has_mapping(
-                                    potential_statement, ("religion_group", "muslim")
-                                ):
-                                    add_branching_mission(dic, (tag + "+Muslim Path"))
-                                    continue
-                                if tag == "RUM" and has_mapping(
-                                    potential_statement, ("religion", "zoroastrian")
-                                ):
-                                    add_branching_mission(
-                                        dic, (tag + "+Zoroastrian Path")
-                                    )
-                                    continue
-                                if tag == "LIT" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "lithuania_pagan_path"),
-                                ):
-                                    add_branching_mission(dic, (tag + "+Pagan Path"))
-                                    continue
-                                if tag == "LIT" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "lithuania_orthodox_path"),
-                                ):
-                                    add_branching_mission(dic, (tag + "+Orthodox Path"))
-                                    continue
-                                if tag == "LIT" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "lithuania_catholic_path"),
-                                ):
-                                    add_branching_mission(dic, (tag + "+Catholic Path"))
-                                    continue
-
-                            add_branching_mission(dic, tag)
-                    else:
-                        for tag in eligible_tags:
-                            if ANTE_BELLUM:
-                                # Check for Golden Horde branches
-                                if tag == "GLH" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "glh_european_tree"),
-                                ):
-                                    add_normal_mission(dic, (tag + "+European Path"))
-                                    continue
-                                if tag == "GLH" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "glh_horde_tree"),
-                                ):
-                                    add_normal_mission(dic, (tag + "+Horde Path"))
-                                    continue
-                                if tag == "YUA" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "YUA_HORDE"),
-                                ):
-                                    add_normal_mission(dic, (tag + "+Horde Path"))
-                                    continue
-                                if tag == "YUA" and has_mapping(
-                                    potential_statement,
-                                    (
-                                        "NOT",
-                                        [
-                                            ("has_country_flag", "YUA_HORDE"),
-                                            ("has_country_flag", "YUA_NESTORIAN"),
-                                        ],
-                                    ),
-                                ):
-                                    add_normal_mission(dic, (tag + "+Sinicized Path"))
-                                    continue
-                                if tag == "YUA" and has_mapping(
-                                    potential_statement,
-                                    ("religion", "nestorian"),
-                                ):
-                                    add_normal_mission(dic, (tag + "+Nestorian Path"))
-                                    continue
-                                if tag == "RUM" and has_mapping(
-                                    potential_statement,
-                                    ("religion_group", "christian"),
-                                ):
-                                    add_normal_mission(dic, (tag + "+Christian Path"))
-                                    continue
-                                if tag == "RUM" and has_mapping(
-                                    potential_statement, ("religion_group", "muslim")
-                                ):
-                                    add_normal_mission(dic, (tag + "+Muslim Path"))
-                                    continue
-                                if tag == "RUM" and has_mapping(
-                                    potential_statement, ("religion", "zoroastrian")
-                                ):
-                                    add_normal_mission(dic, (tag + "+Zoroastrian Path"))
-                                    continue
-                                if tag == "LIT" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "lithuania_pagan_path"),
-                                ):
-                                    add_normal_mission(dic, (tag + "+Pagan Path"))
-                                    continue
-                                if tag == "LIT" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "lithuania_orthodox_path"),
-                                ):
-                                    add_normal_mission(dic, (tag + "+Orthodox Path"))
-                                    continue
-                                if tag == "LIT" and has_mapping(
-                                    potential_statement,
-                                    ("has_country_flag", "lithuania_catholic_path"),
-                                ):
-                                    add_normal_mission(dic, (tag + "+Catholic Path"))
-                                    continue
-
-                            add_normal_mission(dic, tag)
+        file_dic, file_metrics = result
+        metrics.current().merge(file_metrics)
+        for tag, count in file_dic.items():
+            total, normal, branching = dic.get(tag, (0, 0, 0))
+            dic[tag] = (total + count[0], normal + count[1], branching + count[2])
 
     return dic
 
 
+def report_rows(
+    final_dict: dict[str, tuple[int, int, int]], localisation: Any = None
+) -> Iterator[list[str]]:
+    """Rows of the report, one per tag or branch
+
+    Args:
+        final_dict (dict[str, tuple[int, int, int]]): the counts from count_missions
+        localisation (Any, optional): LocalisationResolver to name the tags with. Defaults to None.
+
+    Yields:
+        Iterator[list[str]]: the name, total, normal and branching counts
+    """
+    for k, v in final_dict.items():
+        if localisation is not None:
+            metrics.count("localisation_lookups")
+            # Replace the '+String' in the localisation
+            if "+" in k:
+                klist = k.split("+")
+                k = "%s (%s) (%s)" % (
+                    localisation[klist[0]],
+                    klist[1],
+                    klist[0],
+                )
+            else:
+                # Rewrite the key to include localisation
+                k = "%s (%s)" % (localisation[k], k)
+
+        yield [k, str(v[0]), str(v[1]), str(v[2])]
+
+
 def parse_args(args=None):
     d = "Read list of files and count how many missions a Tag has"
     parser = argparse.ArgumentParser(description=d)
     parser.add_argument(
         "files",
-        type=argparse.FileType("r"),
+        type=str,
         nargs="+",
         help="list of files to read",
     )
@@ -306,7 +275,20 @@ def parse_args(args=None):
         "--out",
         type=argparse.FileType("w"),
         default=sys.stdout,
-        help="Where to output the markdown table",
+        help="Where to output the table",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=["markdown", "html"],
+        default="markdown",
+        help="write a Markdown table, or a styled HTML page with the table",
+    )
+    parser.add_argument(
+        "--highlight-first-row",
+        default=False,
+        action="store_true",
+        help="Highlight the first row on the left, for --format=html",
     )
     parser.add_argument(
         "-d",
@@ -329,12 +311,32 @@ def parse_args(args=None):
         default=False,
         help="enable Ante-Bellum specific code handling",
     )
+    parser.add_argument(
+        "-c",
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="keep parsed files in this directory and reuse them while they don't change",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="how many files to parse at the same time",
+    )
+    parser.add_argument(
+        "-t",
+        "--top",
+        type=int,
+        default=None,
+        help="only list this many countries, the ones with the most missions",
+    )
+    metrics.add_arguments(parser)
     return parser.parse_args(args)
 
 
-def main(args=None) -> int:
-    args = parse_args(args)
-
+def run(args: argparse.Namespace) -> int:
     if args.ante_bellum:
         # We were passed --ante-bellum, enable ANTE_BELLUM specific
         # code handling
@@ -349,9 +351,17 @@ def main(args=None) -> int:
         else:
             args.lang = "english"
 
-    final_dict: dict[str, tuple[int, int, int]] = count_missions(args.files)
+    cache = None
+    if args.cache_dir is not None:
+        cache = ParseCache(args.cache_dir)
 
-    final_list: list[list[str]] = []
+    with metrics.phase("count"):
+        final_dict: dict[str, tuple[int, int, int]] = count_missions(
+            args.files, cache, args.jobs
+        )
+
+    # Listings and stat results shared by everything that looks for files
+    fs = ModFS([], None if cache is None else cache.directory)
 
     search_dirs: list[str] = list()
     localisation = None
@@ -360,38 +370,63 @@ def main(args=None) -> int:
             for dire in args.extra_dir:
                 search_dirs.append(dire)
         for file in reversed(args.files):
-            dir = search_up(file.name)
+            dir = search_up(file, fs)
             if dir is not None:
                 search_dirs.append(dir)
 
         # Remove duplicates
         search_dirs = list(dict.fromkeys(search_dirs))
 
-        localisation = generate_localisation(search_dirs, language=args.lang)
-
-    # Convert it to a list
-    for k, v in final_dict.items():
-        if localisation is not None:
-            # Replace the '+String' in the localisation
-            if "+" in k:
-                klist = k.split("+")
-                k = "%s (%s) (%s)" % (
-                    localisation[klist[0]]["value"][1:-1],
-                    klist[1],
-                    klist[0],
-                )
-            else:
-                # Rewrite the key to include localisation
-                k = "%s (%s)" % (localisation[k]["value"][1:-1], k)
-
-        final_list.append([k, str(v[0]), str(v[1]), str(v[2])])
-        final_list.sort(key=lambda x: int(x[1]), reverse=True)
+        try:
+            with metrics.phase("localisation"):
+                if cache is not None:
+                    # Only the files that changed since the last run are read
+                    localisation = LocalisationStore(
+                        search_dirs, args.lang, cache.directory
+                    )
+                else:
+                    # Only the names of the tags we counted are needed
+                    localisation = generate_localisation(
+                        search_dirs,
+                        language=args.lang,
+                        workers=args.jobs,
+                        keys={k.split("+")[0] for k in final_dict},
+                        references=True,
+                        fs=fs,
+                    )
+        except FileNotFoundError as e:
+            print(e, file=sys.stderr)
+            return 1
+        # The names with the $KEY$ references in them expanded
+        localisation = LocalisationResolver(localisation)
+
+    if args.format == "html":
+        write_table = partial(
+            write_html_table, highlight_first_row=args.highlight_first_row
+        )
+    else:
+        write_table = write_markdown_table
+
+    # Only sorted once all the rows are there, the names are resolved
+    # as they are written
+    with metrics.phase("render"):
+        write_table(
+            args.out,
+            ["Country", "Total", "Normal", "Branching"],
+            report_rows(final_dict, localisation),
+            key=lambda x: int(x[1]),
+            reverse=True,
+            top=args.top,
+        )
+    fs.save()
 
-    final_list.insert(0, ["Country", "Total", "Normal", "Branching"])
+    return 0
 
-    args.out.write(make_markdown_table(final_list))
 
-    return 0
+def main(args=None) -> int:
+    args = parse_args(args)
+    with metrics.instrument("count-missions", args.profile, args.metrics_json):
+        return run(args)
 
 
 if __name__ == "__main__":
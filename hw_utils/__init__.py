@@ -1,4 +1,16 @@
-from .markdown import make_markdown_table
+from .cache import ParseCache
+from .html_table import write_html_table
+from .markdown import make_markdown_table, write_markdown_table
+from .match import TriggerMatcher
+from .vfs import ModFS
 from .walk import has_mapping
 
-__all__ = ("make_markdown_table", "has_mapping")
+__all__ = (
+    "ParseCache",
+    "make_markdown_table",
+    "write_markdown_table",
+    "write_html_table",
+    "has_mapping",
+    "TriggerMatcher",
+    "ModFS",
+)
@@ -0,0 +1,274 @@
+import glob
+import json
+import os
+import pprint
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Iterable, TextIO
+
+from Paradox_Localisation import LocalisationLexer, LocalisationParser
+from Simple_Clausewitz import (
+    LEXERS,
+    PARSERS,
+    decode_file,
+    detect_encoding,
+    iter_events,
+    tree_events,
+    write_json,
+)
+from hw_utils.cache import ParseCache
+from hw_utils.metrics import Metrics
+
+# What is timed for every file, in the order it happens
+PHASES = ("read", "lex", "parse", "write")
+
+# What is counted for every file
+COUNTERS = ("files", "failures", "bytes", "tokens", "entries")
+
+# What is printed for every file
+OUTPUTS = ("tokens", "repr", "pretty", "json", "ndjson")
+
+# JSON of a file is kept in memory up to this many characters before it
+# goes to a temporary file, until the file is known to parse
+_SPOOL_SIZE = 1024 * 1024
+
+
+def expand_paths(args: Iterable[str], suffixes: tuple[str, ...]) -> list[str]:
+    """Turn the files, directories and globs given to a tool into files
+
+    Args:
+        args (Iterable[str]): paths to files or directories, or globs like common/**/*.txt
+        suffixes (tuple[str, ...]): only the files ending with one of these are taken from directories, like (".txt",)
+
+    Returns:
+        list[str]: paths to the files, the ones of directories and globs are
+        sorted, files that don't exist are kept so they are reported
+    """
+    paths: list[str] = []
+    for arg in args:
+        if os.path.isdir(arg):
+            for dirpath, dirnames, filenames in os.walk(arg):
+                # Always gone over in the same order
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.endswith(suffixes):
+                        paths.append(os.path.join(dirpath, name))
+        elif arg != "-" and any(c in arg for c in "*?["):
+            for path in sorted(glob.glob(arg, recursive=True)):
+                if os.path.isfile(path):
+                    paths.append(path)
+        else:
+            paths.append(arg)
+
+    return paths
+
+
+def process_file(
+    path: str,
+    output: str = "tokens",
+    localise: bool = False,
+    engine: str = "fast",
+    cache: ParseCache | None = None,
+    stats: bool = False,
+    out: TextIO = sys.stdout,
+) -> Metrics:
+    """Lex, and parse if the output needs it, a file and print it
+
+    JSON and NDJSON of Clausewitz files are encoded as the file is parsed,
+    without building its tree, unless the file is localisation, a cache is
+    given or the stats are asked for, then the tree is built first.
+
+    Args:
+        path (str): path to the file, or "-" for stdin
+        output (str, optional): what to print, one of OUTPUTS. Defaults to "tokens".
+        localise (bool, optional): the file is localisation and not Clausewitz. Defaults to False.
+        engine (str, optional): lexer and parser engine for Clausewitz files. Defaults to "fast".
+        cache (ParseCache | None, optional): cache of parsed files, not used for stdin. Defaults to None.
+        stats (bool, optional): lex and parse one after the other so they can be timed, and count the tokens. Defaults to False.
+        out (TextIO, optional): where to print. Defaults to sys.stdout.
+
+    Raises:
+        ParseError: if the file is not valid, along with the errors of opening it
+
+    Returns:
+        Metrics: the counters and the time of every phase for the file
+    """
+    metrics = Metrics()
+    metrics.count("files")
+    if path == "-":
+        # stdin has no file to stat and hash for the cache
+        cache = None
+
+    clock = time.perf_counter()
+
+    def lap(phase: str):
+        nonlocal clock
+        now = time.perf_counter()
+        metrics.add_time(phase, now - clock)
+        clock = now
+
+    def read() -> bytes:
+        if path == "-":
+            return sys.stdin.buffer.read()
+        with open(path, "rb") as fd:
+            return fd.read()
+
+    def decode(data: bytes) -> str:
+        metrics.count("bytes", len(data))
+        if localise:
+            return data.decode("utf-8-sig")
+        if engine == "fast":
+            # Bytes that are not valid are replaced, like the fast lexer
+            # does in the strings of a buffer
+            return decode_file(data)
+        encoding, start = detect_encoding(data)
+        return data[start:].decode(encoding)
+
+    if localise:
+        lexer = LocalisationLexer()
+        parser = LocalisationParser()
+    else:
+        lexer = LEXERS[engine]()
+        parser = PARSERS[engine]()
+
+    def tokens(data: bytes) -> Iterable[Any]:
+        text = decode(data)
+        lap("read")
+        if not stats:
+            return lexer.tokenize(text)
+        # Lexed all at once so it can be timed apart from parsing
+        lexed = list(lexer.tokenize(text))
+        metrics.count("tokens", len(lexed))
+        lap("lex")
+        return iter(lexed)
+
+    def parse(data: bytes) -> list[Any]:
+        parsed = parser.parse(tokens(data))
+        lap("parse")
+        return parsed
+
+    if output == "tokens":
+        for tok in tokens(read()):
+            print(tok, file=out)
+        lap("write")
+    elif output in ("json", "ndjson") and not localise and cache is None and not stats:
+        # Encoded as it is parsed, the tree is never built
+        events = iter_events(tokens(read()))
+        if output == "ndjson":
+            # Only whole lines are written, up to the entry with an error
+            write_json(events, out, path)
+        else:
+            # Nothing is written for a file with an error, a document cut
+            # in half would not be valid JSON
+            with tempfile.SpooledTemporaryFile(
+                _SPOOL_SIZE, "w+", encoding="utf-8"
+            ) as spool:
+                write_json(events, spool)
+                spool.write("\n")
+                spool.seek(0)
+                shutil.copyfileobj(spool, out)
+        lap("write")
+    else:
+        if cache is not None:
+            # The cache reads the file, so it knows what was parsed
+            kind = "localisation" if localise else "clausewitz"
+            parsed = cache.load(path, kind, parse)
+            lap("parse")
+        else:
+            parsed = parse(read())
+
+        # Localisation starts with its l_<language> header
+        entries = parsed[1:] if localise else parsed
+        metrics.count("entries", len(entries))
+
+        if output == "pretty":
+            pprint.pprint(parsed, stream=out, indent=2)
+        elif output == "json" and localise:
+            print(json.dumps(parsed), file=out)
+        elif output == "ndjson" and localise:
+            for entry in entries:
+                print(json.dumps({"file": path, **entry}), file=out)
+        elif output in ("json", "ndjson"):
+            write_json(tree_events(parsed), out, path if output == "ndjson" else None)
+            if output == "json":
+                out.write("\n")
+        else:
+            print(parsed, file=out)
+        lap("write")
+
+    return metrics
+
+
+def process_to_file(path: str, **kwargs) -> tuple[str, Metrics]:
+    """Process a file like process_file, but print it to a temporary file,
+    so what is printed can be handed from another process without being
+    kept in memory
+
+    Args:
+        path (str): path to the file
+        **kwargs: the other arguments of process_file, except out
+
+    Raises:
+        ParseError: if the file is not valid, along with the errors of opening it
+
+    Returns:
+        tuple[str, Metrics]: path to the temporary file, which has to be
+        removed once it is read, and the counters and the time of every phase
+    """
+    fd = tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", prefix="lexpar-", suffix=".out", delete=False
+    )
+    try:
+        with fd:
+            metrics = process_file(path, out=fd, **kwargs)
+    except BaseException:
+        os.remove(fd.name)
+        raise
+    return fd.name, metrics
+
+
+def copy_output(name: str, out: TextIO = sys.stdout):
+    """Print what process_to_file printed and remove its temporary file
+
+    Args:
+        name (str): path to the temporary file
+        out (TextIO, optional): where to print it. Defaults to sys.stdout.
+    """
+    try:
+        with open(name, encoding="utf-8") as fd:
+            shutil.copyfileobj(fd, out)
+    finally:
+        os.remove(name)
+
+
+def print_stats(stats: Metrics, elapsed: float, out: TextIO = sys.stderr):
+    """Print the summary of the counters of all the files
+
+    Args:
+        stats (Metrics): the metrics from process_file, merged
+        elapsed (float): how long it took from start to finish, in seconds
+        out (TextIO, optional): where to print it. Defaults to sys.stderr.
+    """
+    counters = {name: stats.counters.get(name, 0) for name in COUNTERS}
+    timers = {phase: stats.timers.get(phase, 0.0) for phase in PHASES}
+    size = counters["bytes"] / (1024 * 1024)
+
+    def rate(seconds: float) -> str:
+        if seconds <= 0:
+            return "-"
+        return "%.2f MB/s" % (size / seconds)
+
+    print(
+        "files:    %d (%d failed)" % (counters["files"], counters["failures"]), file=out
+    )
+    print("bytes:    %d" % counters["bytes"], file=out)
+    print("tokens:   %d" % counters["tokens"], file=out)
+    print("entries:  %d" % counters["entries"], file=out)
+    for phase in PHASES:
+        print(
+            "%-9s %8.3fs %s" % (phase + ":", timers[phase], rate(timers[phase])),
+            file=out,
+        )
+    print("%-9s %8.3fs %s" % ("total:", elapsed, rate(elapsed)), file=out)
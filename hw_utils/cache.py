@@ -0,0 +1,213 @@
+import hashlib
+import os
+import pickle
+from typing import Any, Callable
+
+# Bump whenever the parsers change what they return, every entry written
+# with another version is ignored
+CACHE_VERSION = 3
+
+# 1 GiB
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+
+def default_cache_dir() -> str:
+    """Directory used by ParseCache when none is given
+
+    Returns:
+        str: $XDG_CACHE_HOME/eu4-utils, or ~/.cache/eu4-utils
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "eu4-utils")
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _read(path: str) -> tuple[os.stat_result, bytes]:
+    with open(path, "rb") as fd:
+        # Taken before reading, a file that changes while it is read gets
+        # another mtime than the one stored, so it is checked again
+        st = os.fstat(fd.fileno())
+        return st, fd.read()
+
+
+class ParseCache:
+    """Persistent cache of whatever was parsed out of a file.
+
+    Entries are keyed by the kind of result and the absolute path of the
+    file, and are only used while the file has the same size and mtime,
+    or failing that the same content, as when they were stored.
+
+    Every entry is a pickle of its metadata followed by a pickle of the
+    value, so the value is only loaded when the metadata matches. When
+    the cache grows past its maximum size the least recently used entries
+    are removed.
+    """
+
+    def __init__(self, directory: str | None = None, max_size: int = DEFAULT_MAX_SIZE):
+        """Open, creating it if needed, a cache directory
+
+        Args:
+            directory (str | None, optional): where to keep the cache. Defaults to default_cache_dir().
+            max_size (int, optional): size in bytes after which entries are evicted. Defaults to 1 GiB.
+        """
+        if directory is None:
+            directory = default_cache_dir()
+        self.directory = os.path.abspath(directory)
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Size of all the entries, only counted once something is stored
+        self._size: int | None = None
+
+    def _entry(self, path: str, kind: str) -> str:
+        name = hashlib.sha1(f"{kind}\0{os.path.abspath(path)}".encode()).hexdigest()
+        return os.path.join(self.directory, name + ".pickle")
+
+    def get(self, path: str, kind: str) -> Any:
+        """Get what was stored for a file, if the file didn't change since
+
+        Args:
+            path (str): path to the file that was parsed
+            kind (str): what kind of result was stored, like "clausewitz"
+
+        Returns:
+            Any: the stored value, or None if there is none or it is stale
+        """
+        entry = self._entry(path, kind)
+        touched = False
+        try:
+            st = os.stat(path)
+            with open(entry, "rb") as fd:
+                meta = pickle.load(fd)
+                if meta["version"] != CACHE_VERSION or meta["size"] != st.st_size:
+                    return None
+
+                if meta["mtime"] == st.st_mtime_ns:
+                    value = pickle.load(fd)
+                elif meta["digest"] == _digest(_read(path)[1]):
+                    value = pickle.load(fd)
+                    touched = True
+                else:
+                    return None
+        except (OSError, EOFError, KeyError, TypeError, pickle.UnpicklingError):
+            return None
+
+        if touched:
+            # The file was only touched, store the new mtime so we don't
+            # have to hash it again next time
+            self._store(path, kind, value, st, meta["digest"])
+        else:
+            # Entries are evicted by mtime, so mark this one as just used
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+
+        return value
+
+    def put(
+        self,
+        path: str,
+        kind: str,
+        value: Any,
+        data: bytes | None = None,
+        st: os.stat_result | None = None,
+    ):
+        """Store what was parsed out of a file
+
+        Args:
+            path (str): path to the file that was parsed
+            kind (str): what kind of result is being stored, like "clausewitz"
+            value (Any): any value that can be pickled
+            data (bytes | None, optional): the content that was parsed, the file is read again if not given. Defaults to None.
+            st (os.stat_result | None, optional): stat of the file from before data was read. Defaults to the one of the file now.
+        """
+        if data is None:
+            st, data = _read(path)
+        elif st is None:
+            st = os.stat(path)
+        self._store(path, kind, value, st, _digest(data))
+
+    def _store(self, path: str, kind: str, value: Any, st: os.stat_result, digest: str):
+        meta = {
+            "version": CACHE_VERSION,
+            "size": st.st_size,
+            "mtime": st.st_mtime_ns,
+            "digest": digest,
+        }
+
+        entry = self._entry(path, kind)
+        tmp = "%s.%d.tmp" % (entry, os.getpid())
+        with open(tmp, "wb") as fd:
+            pickle.dump(meta, fd, protocol=5)
+            pickle.dump(value, fd, protocol=5)
+
+        if self._size is None:
+            self._size = self._entries()[1]
+        try:
+            self._size -= os.stat(entry).st_size
+        except OSError:
+            pass
+        self._size += os.stat(tmp).st_size
+        os.replace(tmp, entry)
+
+        if self._size > self.max_size:
+            self.evict()
+
+    def load(self, path: str, kind: str, loader: Callable[[bytes], Any]) -> Any:
+        """Get what was stored for a file, or read it, call loader with its
+        content and store what it returns
+
+        The file is only read once, and what is stored is checked against
+        the content loader was given.
+
+        Args:
+            path (str): path to the file that is parsed
+            kind (str): what kind of result loader returns, like "clausewitz"
+            loader (Callable[[bytes], Any]): parses the content of the file when there is nothing stored
+
+        Returns:
+            Any: the stored value or what loader returned
+        """
+        value = self.get(path, kind)
+        if value is None:
+            st, data = _read(path)
+            value = loader(data)
+            self._store(path, kind, value, st, _digest(data))
+
+        return value
+
+    def _entries(self) -> tuple[list[tuple[int, int, str]], int]:
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for dirent in it:
+                if not dirent.name.endswith(".pickle"):
+                    continue
+                st = dirent.stat()
+                entries.append((st.st_mtime_ns, st.st_size, dirent.path))
+                total += st.st_size
+
+        return entries, total
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is
+        smaller than its maximum size"""
+        entries, total = self._entries()
+        self._size = total
+        if total <= self.max_size:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._size = total
+            if total <= self.max_size:
+                break
@@ -0,0 +1,108 @@
+from html import escape
+from typing import Any, Callable, Iterable, TextIO
+
+from hw_utils.markdown import select_rows
+
+# Page the tables are put in, {{first_child}} is FIRST_CHILD_STYLE when
+# the first column is highlighted and {{content}} is the table
+TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        table {
+            border: solid 1px #DDEEEE;
+            border-collapse: collapse;
+            border-spacing: 0;
+            font: normal 13px Arial, sans-serif;
+            margin-left: auto;
+            margin-right: auto;
+        }
+        table thead th {
+            background-color: #DDEFEF;
+            border: solid 1px #DDEEEE;
+            color: #336B6B;
+            padding: 10px;
+            text-align: left;
+            text-shadow: 1px 1px 1px #fff;
+        }
+        {{first_child}}
+        table tbody td {
+            border: solid 1px #DDEEEE;
+            color: #333;
+            padding: 10px;
+            text-shadow: 1px 1px 1px #fff;
+        }
+    </style>
+</head>
+<body>
+<div class="container">
+{{content}}
+</div>
+</body>
+</html>
+"""
+
+FIRST_CHILD_STYLE = """
+        table tbody tr td:first-child {
+            background-color: #DDEFEF;
+            border: solid 1px #DDEEEE;
+            color: #336B6B;
+            padding: 10px;
+            text-align: left;
+            text-shadow: 1px 1px 1px #fff;
+            font-weight: bold
+        }
+        """
+
+
+def write_html_table(
+    out: TextIO,
+    header: list[Any],
+    rows: Iterable[list[Any]],
+    key: Callable[[list[Any]], Any] | None = None,
+    reverse: bool = False,
+    top: int | None = None,
+    highlight_first_row: bool = False,
+) -> int:
+    """Writes a styled HTML page with a table to a file, one row at a time
+
+    It is the page aux/table-md-to-html.py makes out of the Markdown
+    table of the same rows, without going through Markdown.
+
+    Args:
+        out (TextIO): where to write the page, like sys.stdout.
+        header (list[Any]): the first row, with the names of the columns.
+        rows (Iterable[list[Any]]): the other rows, every cell is a string.
+        key (Callable[[list[Any]], Any] | None, optional): sort the rows by what this returns for them, the sort is stable. Defaults to None.
+        reverse (bool, optional): sort in descending order. Defaults to False.
+        top (int | None, optional): only write this many rows, the first ones once sorted. Defaults to None.
+        highlight_first_row (bool, optional): highlight the first cell of every row, on the left. Defaults to False.
+
+    Returns:
+        int: how many rows were written, without the header
+    """
+    rows = select_rows(rows, key, reverse, top)
+
+    first_child = FIRST_CHILD_STYLE if highlight_first_row else ""
+    before, after = TEMPLATE.replace("{{first_child}}", first_child).split(
+        "{{content}}"
+    )
+
+    out.write(before)
+    out.write("<table>\n<thead>\n<tr>\n")
+    for cell in header:
+        out.write('<th style="text-align: center;">%s</th>\n' % escape(cell))
+    out.write("</tr>\n</thead>\n<tbody>\n")
+
+    written = 0
+    for entry in rows:
+        out.write("<tr>\n")
+        for cell in entry:
+            out.write('<td style="text-align: center;">%s</td>\n' % escape(cell))
+        out.write("</tr>\n")
+        written += 1
+
+    out.write("</tbody>\n</table>")
+    out.write(after)
+
+    return written
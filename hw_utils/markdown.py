@@ -1,4 +1,80 @@
-from typing import Any
+import heapq
+import io
+from typing import Any, Callable, Iterable, TextIO
+
+
+def select_rows(
+    rows: Iterable[list[Any]],
+    key: Callable[[list[Any]], Any] | None = None,
+    reverse: bool = False,
+    top: int | None = None,
+) -> Iterable[list[Any]]:
+    """Sort the rows of a table and only keep the top ones, see write_markdown_table
+
+    Args:
+        rows (Iterable[list[Any]]): the rows
+        key (Callable[[list[Any]], Any] | None, optional): sort the rows by what this returns for them. Defaults to None.
+        reverse (bool, optional): sort in descending order. Defaults to False.
+        top (int | None, optional): only keep this many rows. Defaults to None.
+
+    Returns:
+        Iterable[list[Any]]: the rows, as they were given if there is nothing to do
+    """
+    if top is not None:
+        if key is None:
+            return (row for _, row in zip(range(top), rows))
+        elif reverse:
+            # The same as sorting and taking the first ones, with a heap
+            # of top rows
+            return heapq.nlargest(top, rows, key=key)
+        else:
+            return heapq.nsmallest(top, rows, key=key)
+    elif key is not None:
+        return sorted(rows, key=key, reverse=reverse)
+
+    return rows
+
+
+def write_markdown_table(
+    out: TextIO,
+    header: list[Any],
+    rows: Iterable[list[Any]],
+    key: Callable[[list[Any]], Any] | None = None,
+    reverse: bool = False,
+    top: int | None = None,
+) -> int:
+    """Writes a Markdown table to a file, one row at a time
+
+    Rows are only kept in memory when they have to be sorted, and only
+    the top ones are kept when asked for them.
+
+    Args:
+        out (TextIO): where to write the table, like sys.stdout.
+        header (list[Any]): the first row, with the names of the columns.
+        rows (Iterable[list[Any]]): the other rows, every cell is a string.
+        key (Callable[[list[Any]], Any] | None, optional): sort the rows by what this returns for them, the sort is stable. Defaults to None.
+        reverse (bool, optional): sort in descending order. Defaults to False.
+        top (int | None, optional): only write this many rows, the first ones once sorted. Defaults to None.
+
+    Returns:
+        int: how many rows were written, without the header
+    """
+    rows = select_rows(rows, key, reverse, top)
+
+    nl = "\n"
+
+    out.write(nl)
+    out.write(f"| {' | '.join(header)} |{nl}")
+    out.write(f"| {' | '.join([':-:']*len(header))} |{nl}")
+
+    written = 0
+    for entry in rows:
+        out.write(f"| {' | '.join(entry)} |{nl}")
+        written += 1
+
+    out.write(nl)
+
+    return written
 
 
 def make_markdown_table(array: list[Any]) -> str:
@@ -15,19 +91,7 @@ def make_markdown_table(array: list[Any]) -> str:
     Returns:
         str: a string representation of the generated markdown table
     """
+    markdown = io.StringIO()
+    write_markdown_table(markdown, array[0], array[1:])
 
-    nl = "\n"
-
-    markdown = nl
-    markdown += f"| {' | '.join(array[0])} |"
-
-    markdown += nl
-    markdown += f"| {' | '.join([':-:']*len(array[0]))} |"
-
-    markdown += nl
-    for entry in array[1:]:
-        markdown += f"| {' | '.join(entry)} |{nl}"
-
-    markdown += nl
-
-    return markdown
+    return markdown.getvalue()
@@ -0,0 +1,82 @@
+from typing import Any, Iterable, Iterator
+
+from hw_utils.metrics import count
+
+
+def _is_block(value: Any) -> bool:
+    # Lists from the parsers, or any of the Simple_Clausewitz trees
+    return not isinstance(value, (str, int, float)) and hasattr(value, "__iter__")
+
+
+class TriggerMatcher:
+    """Checks many (key, value) mappings against a trigger block at once.
+
+    It gives the same answer as calling has_mapping once per mapping, but
+    goes over the block a single time: a mapping only counts when it is
+    not negated by the NOT = { } blocks it is inside of, and AND = { } and
+    OR = { } blocks are looked into. Mappings can be subtrees too, like
+    ("NOT", [("has_country_flag", "A"), ("has_country_flag", "B")]).
+
+    It can also collect the values of some keys along the way, under the
+    same rules, like the tags a trigger is for.
+    """
+
+    def __init__(
+        self, mappings: Iterable[tuple[Any, Any]], collect: Iterable[Any] = ()
+    ):
+        """Compile the mappings to look for
+
+        Args:
+            mappings (Iterable[tuple[Any, Any]]): the (key, value) tuples to look for
+            collect (Iterable[Any], optional): keys to collect the values of. Defaults to ().
+        """
+        self.mappings = list(mappings)
+        self.collect = list(collect)
+
+        # The mappings of each key, so only those are compared
+        self._by_key: dict[Any, list[tuple[int, Any]]] = dict()
+        for i, (key, value) in enumerate(self.mappings):
+            self._by_key.setdefault(key, []).append((i, value))
+
+    def match(self, tree: Iterable[Any]) -> tuple[list[bool], dict[Any, set[Any]]]:
+        """Go over a trigger block once
+
+        Args:
+            tree (Iterable[Any]): the trigger block, like the potential = { } of a mission group
+
+        Returns:
+            tuple[list[bool], dict[Any, set[Any]]]: whether each mapping is
+            present, in the order they were given, and the values found for
+            every key to collect
+        """
+        count("trigger_matches")
+        found = [False] * len(self.mappings)
+        collected: dict[Any, set[Any]] = {key: set() for key in self.collect}
+
+        # Blocks we still have to go over, and whether they are negated
+        stack: list[tuple[Iterator[Any], bool]] = [(iter(tree), False)]
+        while stack:
+            elements, in_not = stack.pop()
+            for elem in elements:
+                if not isinstance(elem, tuple):
+                    continue
+
+                key, value = elem
+                if not in_not:
+                    for i, mapping in self._by_key.get(key, ()):
+                        if value == mapping:
+                            found[i] = True
+                    if key in collected:
+                        collected[key].add(value)
+
+                # Only blocks can be looked into, like NOT = { }
+                if not isinstance(key, str) or not _is_block(value):
+                    continue
+                operator = key.upper()
+                if operator == "NOT":
+                    # We are inside a NOT = { } block
+                    stack.append((iter(value), not in_not))
+                elif operator == "AND" or operator == "OR":
+                    stack.append((iter(value), in_not))
+
+        return found, collected
@@ -0,0 +1,206 @@
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, TextIO, TypeVar
+
+T = TypeVar("T")
+
+# How many functions --profile prints
+PROFILE_LINES = 40
+
+
+class Metrics:
+    """Counters and timers of a run, like how many files were parsed and
+    how long the localisation took to load.
+
+    Phases can be inside of each other, every timer is how long was spent
+    in its phase in total, including the phases inside of it. Metrics can
+    be pickled, so the ones of the work done in other processes can be
+    sent back and added to the ones of the run, see collect().
+    """
+
+    def __init__(self):
+        self.counters: dict[str, int] = dict()
+        self.timers: dict[str, float] = dict()
+
+    def count(self, name: str, n: int = 1):
+        """Add to a counter
+
+        Args:
+            name (str): the counter, like "files"
+            n (int, optional): how much to add. Defaults to 1.
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name: str, seconds: float):
+        """Add to the timer of a phase
+
+        Args:
+            name (str): the phase, like "parse"
+            seconds (float): how long was spent in it
+        """
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time what is done inside of the with statement
+
+        Args:
+            name (str): the phase, like "parse"
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def merge(self, other: "Metrics"):
+        """Add the counters and timers of other to these
+
+        Args:
+            other (Metrics): the metrics to add
+        """
+        for name, n in other.counters.items():
+            self.count(name, n)
+        for name, seconds in other.timers.items():
+            self.add_time(name, seconds)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Counters and timers, sorted by name, as they are written as JSON
+
+        Returns:
+            dict[str, Any]: {"counters": {...}, "timers": {...}}, the timers are in seconds
+        """
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "timers": dict(sorted(self.timers.items())),
+        }
+
+
+# What count(), add_time() and phase() add to
+_current = Metrics()
+
+
+def current() -> Metrics:
+    """The metrics being added to in this process
+
+    Returns:
+        Metrics: the metrics of the run, or of the call inside collect()
+    """
+    return _current
+
+
+def count(name: str, n: int = 1):
+    """Add to a counter of the current metrics, see Metrics.count"""
+    _current.count(name, n)
+
+
+def add_time(name: str, seconds: float):
+    """Add to a timer of the current metrics, see Metrics.add_time"""
+    _current.add_time(name, seconds)
+
+
+def phase(name: str):
+    """Time a phase in the current metrics, see Metrics.phase"""
+    return _current.phase(name)
+
+
+def collect(func: Callable[..., T], *args, **kwargs) -> tuple[T, Metrics]:
+    """Call a function with metrics of its own, so what it counts can be
+    sent back from another process, like the ones of map_files
+
+    Args:
+        func (Callable[..., T]): the function, it is given args and kwargs
+
+    Returns:
+        tuple[T, Metrics]: what the function returned, and what it counted,
+        which has to be merged into the metrics of the run
+    """
+    global _current
+    previous = _current
+    _current = Metrics()
+    try:
+        return func(*args, **kwargs), _current
+    finally:
+        _current = previous
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Add --profile and --metrics-json to the arguments of a tool
+
+    Args:
+        parser (argparse.ArgumentParser): the parser of the arguments of the tool
+    """
+    parser.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const="",
+        default=None,
+        metavar="FILE",
+        help="run under cProfile and print the slowest functions to stderr, "
+        "the stats are also written to FILE if given, other processes are not profiled",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="write the timers and counters of the run as JSON to FILE, '-' is stderr",
+    )
+
+
+def write_metrics(out: TextIO, tool: str, elapsed: float, metrics: Metrics):
+    """Write the metrics of a run as a JSON object on a line
+
+    Args:
+        out (TextIO): where to write them
+        tool (str): name of the tool, like "count-missions"
+        elapsed (float): how long the whole run took, in seconds
+        metrics (Metrics): the metrics of the run
+    """
+    out.write(
+        json.dumps({"tool": tool, "elapsed": elapsed, **metrics.as_dict()}) + "\n"
+    )
+
+
+@contextmanager
+def instrument(
+    tool: str, profile: str | None = None, metrics_json: str | None = None
+) -> Iterator[Metrics]:
+    """Run a tool with what --profile and --metrics-json ask for
+
+    Args:
+        tool (str): name of the tool, like "count-missions"
+        profile (str | None, optional): the value of --profile, "" only prints the stats. Defaults to None.
+        metrics_json (str | None, optional): the value of --metrics-json. Defaults to None.
+
+    Yields:
+        Iterator[Metrics]: the metrics of the run
+    """
+    profiler = cProfile.Profile() if profile is not None else None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield _current
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+
+        if profiler is not None:
+            if profile:
+                profiler.dump_stats(profile)
+            stats = pstats.Stats(profiler, stream=sys.stderr)
+            stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+
+        if metrics_json == "-":
+            write_metrics(sys.stderr, tool, elapsed, _current)
+        elif metrics_json is not None:
+            with open(metrics_json, "w") as fd:
+                write_metrics(fd, tool, elapsed, _current)
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import pickle
+import stat
+
+from hw_utils.metrics import count, phase
+
+
+class ModFS:
+    """Files of the game folders as the game sees them, over a stack of
+    roots like a mod, the DLC it needs and the game itself.
+
+    Roots are given from the one that takes precedence to the last one, a
+    file in a folder of a root overrides the files with the same name in
+    the same folder of the roots after it.
+
+    Listings of directories and the stat of files are only asked to the
+    filesystem once, so every tool going over the same folders shares a
+    single pass over them. Listings can also be kept on disk, they are
+    used while the mtime of their directory doesn't change.
+    """
+
+    def __init__(self, roots: list[str], cache_dir: str | None = None):
+        """Stack the roots
+
+        Args:
+            roots (list[str]): paths to the roots, the first one overrides the others
+            cache_dir (str | None, optional): keep the listings in this directory, like the one of a ParseCache. Defaults to None.
+        """
+        self.roots = list(roots)
+        self._listings: dict[str, list[str]] = dict()
+        self._stats: dict[str, os.stat_result | None] = dict()
+
+        # Listings from previous runs, by absolute path of the directory,
+        # with the mtime it had
+        self._stored: dict[str, tuple[int, list[str]]] = dict()
+        self._changed = False
+        self._path = None
+        # The stack this one shares its listings with
+        self._parent: ModFS | None = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            name = hashlib.sha1("\0".join(self.roots).encode()).hexdigest()
+            self._path = os.path.join(cache_dir, "listings-%s.pickle" % name)
+            try:
+                with open(self._path, "rb") as fd:
+                    self._stored = pickle.load(fd)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                pass
+
+    def stack(self, roots: list[str]) -> "ModFS":
+        """Another stack of roots, sharing the listings and stat results
+        of this one
+
+        Args:
+            roots (list[str]): paths to the roots, the first one overrides the others
+
+        Returns:
+            ModFS: the new stack
+        """
+        fs = ModFS(roots)
+        fs._listings = self._listings
+        fs._stats = self._stats
+        fs._stored = self._stored
+        fs._parent = self
+        return fs
+
+    def stat(self, path: str) -> os.stat_result | None:
+        """stat a path, only once
+
+        Args:
+            path (str): path to a file or directory
+
+        Returns:
+            os.stat_result | None: the result, or None if it doesn't exist
+        """
+        if path not in self._stats:
+            try:
+                self._stats[path] = os.stat(path)
+            except OSError:
+                self._stats[path] = None
+        return self._stats[path]
+
+    def isdir(self, path: str) -> bool:
+        """Whether a path is a directory
+
+        Args:
+            path (str): the path
+
+        Returns:
+            bool: True if it is a directory
+        """
+        st = self.stat(path)
+        return st is not None and stat.S_ISDIR(st.st_mode)
+
+    def listdir(self, path: str) -> list[str]:
+        """Names in a directory, in the order os.listdir gives them
+
+        Args:
+            path (str): path to the directory
+
+        Returns:
+            list[str]: the names, empty if it is not a directory
+        """
+        if path in self._listings:
+            return self._listings[path]
+
+        names: list[str] = []
+        if self.isdir(path):
+            mtime = self.stat(path).st_mtime_ns
+            key = os.path.abspath(path)
+            stored = self._stored.get(key)
+            if stored is not None and stored[0] == mtime:
+                names = stored[1]
+            else:
+                count("listdir")
+                with phase("listdir"):
+                    names = os.listdir(path)
+                self._stored[key] = (mtime, names)
+                (self._parent or self)._changed = True
+
+        self._listings[path] = names
+        return names
+
+    def files(self, folder: str, suffix: str = "") -> list[str]:
+        """The files of a game folder that are not overridden
+
+        Args:
+            folder (str): the folder in every root, like "common/ideas"
+            suffix (str, optional): only the files whose name ends with this, like "l_english.yml". Defaults to "".
+
+        Raises:
+            FileNotFoundError: if the folder is not in any of the roots
+
+        Returns:
+            list[str]: paths to the files, the ones of the first root first
+        """
+        seen: set[str] = set()
+        paths: list[str] = []
+        found = False
+        for root in self.roots:
+            # A root without the folder is fine, as long as one has it
+            found = found or self.isdir(f"{root}/{folder}")
+            for name in self.listdir(f"{root}/{folder}"):
+                if name in seen or not name.endswith(suffix):
+                    continue
+                seen.add(name)
+                paths.append(f"{root}/{folder}/{name}")
+
+        if not found:
+            raise FileNotFoundError("%s: not found in any root" % folder)
+        return paths
+
+    def find(self, path: str) -> str | None:
+        """Where a file of the game is, going through the roots in order
+
+        Args:
+            path (str): path of the file inside a root, like "common/policies/00_adm.txt"
+
+        Returns:
+            str | None: the path in the first root that has it, or None
+        """
+        for root in self.roots:
+            if self.stat(f"{root}/{path}") is not None:
+                return f"{root}/{path}"
+        return None
+
+    def save(self):
+        """Write the listings to disk, if they are kept there and some changed"""
+        if self._parent is not None:
+            self._parent.save()
+            return
+        if self._path is None or not self._changed:
+            return
+
+        tmp = "%s.%d.tmp" % (self._path, os.getpid())
+        with open(tmp, "wb") as fd:
+            pickle.dump(self._stored, fd, protocol=5)
+        os.replace(tmp, self._path)
+        self._changed = False
@@ -1,3 +1,6 @@
+from hw_utils.metrics import count
+
+
 def has_mapping(tree: tuple, mapping: tuple, in_not: bool = False) -> bool:
     """check if a tuple is present in the given tree
 
@@ -9,6 +12,7 @@ def has_mapping(tree: tuple, mapping: tuple, in_not: bool = False) -> bool:
     Returns:
         bool: whether the mapping is present in the tree
     """
+    count("has_mapping")
     for elem in tree:
         if elem == mapping and in_not is False:
             return True